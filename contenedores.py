@@ -0,0 +1,334 @@
+"""
+Lectura y escritura de canciones dentro de contenedores .sng (Clone Hero) y .zip.
+
+Una ruta puede ser un archivo normal, un contenedor ("cancion.sng", se usa su
+notes.mid / notes.chart) o un miembro concreto ("pack.zip::Banda - Tema/notes.mid").
+
+Al guardar se crea un contenedor NUEVO a partir del original: el archivo de notas
+se reemplaza y el resto de miembros (audio, arte, song.ini...) se copian byte a
+byte, sin descomprimir ni recomprimir (en .sng se copian ya enmascarados).
+"""
+import io
+import os
+import struct
+import time
+import zlib
+
+EXTENSIONES_CONTENEDOR = ('.sng', '.zip')
+NOMBRES_NOTAS = ('notes.mid', 'notes.chart')  # En orden de preferencia
+SEPARADOR_MIEMBRO = '::'
+TAMANO_BLOQUE = 1024 * 1024  # Copia de miembros en bloques de 1 MB
+
+
+# --- RUTAS ---
+def separar_ruta(ruta):
+    """'pack.zip::dir/notes.mid' → ('pack.zip', 'dir/notes.mid'); 'x.sng' → ('x.sng', None)"""
+    if SEPARADOR_MIEMBRO in ruta:
+        contenedor, miembro = ruta.split(SEPARADOR_MIEMBRO, 1)
+        if os.path.splitext(contenedor)[1].lower() in EXTENSIONES_CONTENEDOR:
+            return contenedor, miembro
+    return ruta, None
+
+
+def es_contenedor(ruta):
+    contenedor, _ = separar_ruta(ruta)
+    return os.path.splitext(contenedor)[1].lower() in EXTENSIONES_CONTENEDOR
+
+
+def tipo_contenedor(ruta):
+    """'.sng' o '.zip'"""
+    contenedor, _ = separar_ruta(ruta)
+    return os.path.splitext(contenedor)[1].lower()
+
+
+def buscar_miembro_notas(nombres):
+    """Elige notes.mid / notes.chart entre los nombres de miembros (el menos anidado)"""
+    for preferido in NOMBRES_NOTAS:
+        candidatos = [n for n in nombres if n.replace('\\', '/').rsplit('/', 1)[-1].lower() == preferido]
+        if candidatos:
+            return min(candidatos, key=lambda n: (n.count('/'), n))
+    return None
+
+
+def miembro_notas(ruta):
+    """Nombre del miembro de notas que se usará para una ruta de contenedor"""
+    contenedor, miembro = separar_ruta(ruta)
+    if miembro:
+        return miembro
+    miembro = buscar_miembro_notas(listar_miembros(contenedor))
+    if miembro is None:
+        raise ValueError(f"No hay notes.mid ni notes.chart en {os.path.basename(contenedor)}")
+    return miembro
+
+
+def extension_efectiva(ruta):
+    """Extensión del archivo de notas ('.mid' / '.chart'), esté o no en un contenedor"""
+    if es_contenedor(ruta):
+        return os.path.splitext(miembro_notas(ruta))[1].lower()
+    return os.path.splitext(ruta)[1].lower()
+
+
+# --- SNG ---
+# Header: "SNGPKG", versión (uint32), máscara XOR (16 bytes)
+SNG_CABECERA = struct.Struct("<6sI16s")
+SNG_MAGIC = b"SNGPKG"
+
+
+def _leer_indice_sng(f):
+    """
+    Retorna (version, mascara, bytes_metadatos, [(nombre, tamano, offset), ...]).
+    bytes_metadatos es la sección de metadatos original completa (se copia tal cual).
+    """
+    magic, version, mascara = SNG_CABECERA.unpack(f.read(SNG_CABECERA.size))
+    if magic != SNG_MAGIC:
+        raise ValueError("No es un archivo .sng válido")
+
+    # Metadatos: longitud (uint64), cantidad (uint64), pares clave/valor (int32 + bytes)
+    inicio_metadatos = f.tell()
+    _, cantidad = struct.unpack("<QQ", f.read(16))
+    for _ in range(cantidad):
+        for _ in range(2):
+            (longitud,) = struct.unpack("<i", f.read(4))
+            f.seek(longitud, io.SEEK_CUR)
+    fin_metadatos = f.tell()
+    f.seek(inicio_metadatos)
+    bytes_metadatos = f.read(fin_metadatos - inicio_metadatos)
+
+    # Índice de archivos: longitud (uint64), cantidad (uint64), entradas
+    _, cantidad = struct.unpack("<QQ", f.read(16))
+    archivos = []
+    for _ in range(cantidad):
+        (longitud_nombre,) = struct.unpack("<B", f.read(1))
+        nombre = f.read(longitud_nombre).decode('utf-8')
+        tamano, offset = struct.unpack("<QQ", f.read(16))
+        archivos.append((nombre, tamano, offset))
+
+    return version, mascara, bytes_metadatos, archivos
+
+
+def _mascara_sng(data, mascara):
+    """Aplica/quita la máscara XOR de .sng (simétrica): clave[i] = mascara[i % 16] ^ (i & 0xFF)"""
+    if not data:
+        return b""
+    # La clave se repite cada 256 bytes: XOR de enteros grandes en vez de byte a byte
+    patron = bytes(mascara[i % 16] ^ i for i in range(256))
+    clave = (patron * (len(data) // 256 + 1))[:len(data)]
+    resultado = int.from_bytes(data, 'little') ^ int.from_bytes(clave, 'little')
+    return resultado.to_bytes(len(data), 'little')
+
+
+def _leer_miembro_sng(ruta, miembro):
+    with open(ruta, 'rb') as f:
+        _, mascara, _, archivos = _leer_indice_sng(f)
+        for nombre, tamano, offset in archivos:
+            if nombre == miembro:
+                f.seek(offset)
+                return _mascara_sng(f.read(tamano), mascara)
+    raise KeyError(f"'{miembro}' no está en {os.path.basename(ruta)}")
+
+
+def _escribir_sng(ruta_destino, ruta_origen, reemplazados, miembro_nuevo, data):
+    with open(ruta_origen, 'rb') as origen:
+        version, mascara, bytes_metadatos, archivos = _leer_indice_sng(origen)
+
+        # Lista final: (nombre, tamano, offset_origen o None para el nuevo)
+        nuevo = (miembro_nuevo, len(data), None)
+        finales = _lista_final(archivos, lambda archivo: archivo[0] in reemplazados, nuevo)
+
+        # Índice con offsets absolutos en el archivo nuevo (entrada = 1 + nombre + 16 bytes)
+        tamano_indice = sum(1 + len(nombre.encode('utf-8')) + 16 for nombre, _, _ in finales)
+        inicio_datos = SNG_CABECERA.size + len(bytes_metadatos) + 16 + tamano_indice + 8
+
+        entradas = bytearray()
+        offset_nuevo = inicio_datos
+        for nombre, tamano, _ in finales:
+            nombre_bytes = nombre.encode('utf-8')
+            entradas.extend(struct.pack("<B", len(nombre_bytes)) + nombre_bytes +
+                            struct.pack("<QQ", tamano, offset_nuevo))
+            offset_nuevo += tamano
+
+        with open(ruta_destino, 'wb') as f:
+            f.write(SNG_CABECERA.pack(SNG_MAGIC, version, mascara))
+            f.write(bytes_metadatos)
+            f.write(struct.pack("<QQ", 8 + len(entradas), len(finales)))
+            f.write(entradas)
+            f.write(struct.pack("<Q", offset_nuevo - inicio_datos))
+            for nombre, tamano, offset in finales:
+                if offset is None:
+                    f.write(_mascara_sng(data, mascara))
+                else:
+                    # Copia directa de los bytes enmascarados
+                    origen.seek(offset)
+                    _copiar_bloques(origen, f, tamano)
+
+
+# --- ZIP ---
+# Formatos de cabecera ZIP (APPNOTE): local, directorio central y fin de directorio
+ZIP_LOCAL = struct.Struct("<4s2B4HL2L2H")
+ZIP_CENTRAL = struct.Struct("<4s4B4HL2L5H2L")
+ZIP_FIN = struct.Struct("<4s4H2LH")
+ZIP_LIMITE = 0xFFFFFFFF
+
+
+def _fecha_dos(date_time):
+    anio, mes, dia, hora, minuto, segundo = date_time
+    return ((hora << 11) | (minuto << 5) | (segundo // 2),
+            ((anio - 1980) << 9) | (mes << 5) | dia)
+
+
+def _nombre_zip(nombre):
+    """(bytes del nombre, flag UTF-8)"""
+    try:
+        return nombre.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return nombre.encode('utf-8'), 0x800
+
+
+def _escribir_zip(ruta_destino, ruta_origen, reemplazados, miembro_nuevo, data):
+    """
+    Copia el .zip miembro a miembro (datos comprimidos tal cual) con el archivo
+    de notas nuevo. NO conserva el comentario del archivo ni los campos extra de
+    cada miembro (timestamps NTFS/Unix, etc.): Clone Hero no los usa.
+    """
+    import zipfile
+
+    # Miembro nuevo: deflate crudo
+    compresor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    comprimido = compresor.compress(data) + compresor.flush()
+    crc_nuevo = zlib.crc32(data) & 0xFFFFFFFF
+
+    with zipfile.ZipFile(ruta_origen) as zf, open(ruta_origen, 'rb') as origen, \
+            open(ruta_destino, 'wb') as f:
+        infos = zf.infolist()
+        if len(infos) >= 0xFFFF or any(
+                i.file_size >= ZIP_LIMITE or i.compress_size >= ZIP_LIMITE or i.header_offset >= ZIP_LIMITE
+                for i in infos):
+            raise ValueError("ZIP64 no soportado")
+
+        # (info de origen o None para el nuevo) en orden final
+        finales = _lista_final(infos, lambda info: info.filename in reemplazados, None)
+
+        central = bytearray()
+        for info in finales:
+            offset_local = f.tell()
+            if info is None:
+                nombre, flag_utf8 = _nombre_zip(miembro_nuevo)
+                hora, fecha = _fecha_dos(time.localtime()[:6])
+                version, flags, metodo = 20, flag_utf8, zipfile.ZIP_DEFLATED
+                crc, tamano_comprimido, tamano = crc_nuevo, len(comprimido), len(data)
+                atributos_externos = 0o644 << 16
+            else:
+                nombre = info.filename.encode('utf-8' if info.flag_bits & 0x800 else 'cp437')
+                hora, fecha = _fecha_dos(info.date_time)
+                # Sin data descriptor: CRC y tamaños van en la cabecera local
+                version, flags, metodo = info.extract_version, info.flag_bits & ~0x08, info.compress_type
+                crc, tamano_comprimido, tamano = info.CRC, info.compress_size, info.file_size
+                atributos_externos = info.external_attr
+
+            f.write(ZIP_LOCAL.pack(b"PK\x03\x04", version, 0, flags, metodo, hora, fecha,
+                                   crc, tamano_comprimido, tamano, len(nombre), 0))
+            f.write(nombre)
+            if info is None:
+                f.write(comprimido)
+            else:
+                # Datos comprimidos originales, sin recomprimir
+                origen.seek(info.header_offset)
+                cabecera = ZIP_LOCAL.unpack(origen.read(ZIP_LOCAL.size))
+                origen.seek(cabecera[-2] + cabecera[-1], io.SEEK_CUR)
+                _copiar_bloques(origen, f, tamano_comprimido)
+
+            central.extend(ZIP_CENTRAL.pack(b"PK\x01\x02", 20, 3 if info is None else info.create_system,
+                                            version, 0, flags, metodo, hora, fecha, crc,
+                                            tamano_comprimido, tamano, len(nombre), 0, 0, 0, 0,
+                                            atributos_externos, offset_local))
+            central.extend(nombre)
+
+        inicio_central = f.tell()
+        if inicio_central >= ZIP_LIMITE:
+            raise ValueError("ZIP64 no soportado")
+        f.write(central)
+        f.write(ZIP_FIN.pack(b"PK\x05\x06", 0, 0, len(finales), len(finales),
+                             len(central), inicio_central, 0))
+
+
+# --- API ---
+def listar_miembros(ruta_contenedor):
+    if tipo_contenedor(ruta_contenedor) == '.zip':
+        import zipfile
+        with zipfile.ZipFile(ruta_contenedor) as zf:
+            return [info.filename for info in zf.infolist() if not info.is_dir()]
+    with open(ruta_contenedor, 'rb') as f:
+        return [nombre for nombre, _, _ in _leer_indice_sng(f)[3]]
+
+
+def leer_bytes(ruta):
+    """Bytes del archivo de notas: archivo normal o miembro de un contenedor"""
+    if not es_contenedor(ruta):
+        with open(ruta, 'rb') as f:
+            return f.read()
+
+    contenedor, _ = separar_ruta(ruta)
+    miembro = miembro_notas(ruta)
+    if tipo_contenedor(contenedor) == '.zip':
+        import zipfile
+        with zipfile.ZipFile(contenedor) as zf:
+            return zf.read(miembro)
+    return _leer_miembro_sng(contenedor, miembro)
+
+
+def escribir_contenedor(ruta_destino, ruta_origen, data, extension):
+    """
+    Crea ruta_destino copiando el contenedor ruta_origen con el archivo de notas
+    reemplazado por data (extension '.mid' o '.chart'). Cualquier notes.mid /
+    notes.chart de la misma carpeta se sustituye por el nuevo.
+    """
+    if ruta_origen is None:
+        raise ValueError("Para escribir un .sng/.zip hace falta el contenedor de origen "
+                         "(de él se copian audio, arte y song.ini)")
+    destino, _ = separar_ruta(ruta_destino)
+    origen, _ = separar_ruta(ruta_origen)
+    if not es_contenedor(ruta_origen) or tipo_contenedor(origen) != tipo_contenedor(destino):
+        raise ValueError("El contenedor de salida debe ser del mismo tipo que el de entrada")
+
+    miembro_original = miembro_notas(ruta_origen).replace('\\', '/')
+    carpeta = miembro_original[:miembro_original.rfind('/') + 1]
+    miembro_nuevo = carpeta + 'notes' + extension
+    reemplazados = {nombre for nombre in listar_miembros(origen)
+                    if nombre.replace('\\', '/').lower() in {(carpeta + n).lower() for n in NOMBRES_NOTAS}}
+
+    # Escribir a temporal: el destino puede ser el mismo archivo que el origen
+    temporal = destino + '.tmp'
+    try:
+        if tipo_contenedor(destino) == '.zip':
+            _escribir_zip(temporal, origen, reemplazados, miembro_nuevo, data)
+        else:
+            _escribir_sng(temporal, origen, reemplazados, miembro_nuevo, data)
+        os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def _lista_final(miembros, es_reemplazado, nuevo):
+    """Miembros en orden, con el nuevo en el lugar del primer reemplazado (o al final)"""
+    finales = []
+    insertado = False
+    for miembro in miembros:
+        if es_reemplazado(miembro):
+            if not insertado:
+                finales.append(nuevo)
+                insertado = True
+            continue
+        finales.append(miembro)
+    if not insertado:
+        finales.append(nuevo)
+    return finales
+
+
+def _copiar_bloques(origen, destino, tamano):
+    while tamano > 0:
+        bloque = origen.read(min(TAMANO_BLOQUE, tamano))
+        if not bloque:
+            raise ValueError("Contenedor truncado")
+        destino.write(bloque)
+        tamano -= len(bloque)
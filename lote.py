@@ -0,0 +1,307 @@
+"""
+Procesamiento por lotes de una biblioteca de canciones con journal de checkpoints.
+
+    python lote.py BIBLIOTECA SALIDA [--journal lote.journal] [--workers 4]
+
+Reduce cada .mid/.chart de BIBLIOTECA y escribe REDUCED_<nombre> en SALIDA
+(respetando las subcarpetas). Cada archivo terminado se registra en un journal
+append-only (una línea JSON por archivo). Al relanzar, los archivos ya
+completados se omiten y los fallidos se reintentan hasta --max-intentos.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from reducer import reduce_chart_text, reduce_midi_bytes
+
+# --- CONFIGURACIÓN ---
+EXTENSIONES = ('.mid', '.chart')
+JOURNAL_DEFECTO = 'lote.journal'
+MAX_INTENTOS = 3
+FSYNC_CADA_REGISTROS = 64   # fsync tras N registros...
+FSYNC_CADA_SEGUNDOS = 2.0   # ...o tras N segundos, lo que ocurra antes
+
+
+class Journal:
+    """
+    Journal append-only de archivos procesados.
+    Cada línea: {"entrada", "tamano", "mtime", "hash", "salida", "estado", "intentos", "error"}
+    El último registro de cada entrada es el vigente.
+
+    Los registros se acumulan y se escriben por lotes: primero fsync de las salidas
+    'ok' del lote (y de sus carpetas), después se escriben sus líneas y fsync del
+    journal. Así una línea 'ok' nunca llega a disco antes que su salida, con dos
+    fsync por lote en vez de por archivo. Un corte pierde como mucho un lote, que
+    se rehace en la siguiente ejecución.
+    """
+
+    def __init__(self, ruta, fsync_registros=FSYNC_CADA_REGISTROS, fsync_segundos=FSYNC_CADA_SEGUNDOS):
+        self.ruta = ruta
+        self.fsync_registros = fsync_registros
+        self.fsync_segundos = fsync_segundos
+        self.registros = self.cargar(ruta)
+        self.archivo = open(ruta, 'a', encoding='utf-8')
+        self.pendientes = []
+        self.ultimo_fsync = time.monotonic()
+
+    @staticmethod
+    def cargar(ruta):
+        """Lee el journal existente. Retorna {entrada: último registro}"""
+        registros = {}
+        if not os.path.exists(ruta):
+            return registros
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                    registros[registro['entrada']] = registro
+                except (ValueError, KeyError):
+                    # Línea truncada por un corte a mitad de escritura
+                    continue
+        return registros
+
+    def registrar(self, registro):
+        self.registros[registro['entrada']] = registro
+        self.pendientes.append(registro)
+        if (len(self.pendientes) >= self.fsync_registros
+                or time.monotonic() - self.ultimo_fsync >= self.fsync_segundos):
+            self.sincronizar()
+
+    def sincronizar(self):
+        if self.pendientes:
+            salidas = [registro['salida'] for registro in self.pendientes if registro['estado'] == 'ok']
+            for salida in salidas:
+                sincronizar_archivo(salida)
+            for carpeta in sorted({os.path.dirname(salida) or '.' for salida in salidas}):
+                sincronizar_archivo(carpeta)
+            for registro in self.pendientes:
+                self.archivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            self.archivo.flush()
+            os.fsync(self.archivo.fileno())
+            self.pendientes = []
+        self.ultimo_fsync = time.monotonic()
+
+    def cerrar(self):
+        self.sincronizar()
+        self.archivo.close()
+
+
+def hash_contenido(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def buscar_canciones(biblioteca):
+    """Rutas de .mid/.chart bajo biblioteca, en orden estable"""
+    rutas = []
+    for carpeta, subcarpetas, archivos in os.walk(biblioteca):
+        subcarpetas.sort()
+        for nombre in sorted(archivos):
+            if os.path.splitext(nombre)[1].lower() in EXTENSIONES and not nombre.startswith('REDUCED_'):
+                rutas.append(os.path.join(carpeta, nombre))
+    return rutas
+
+
+def ruta_de_salida(entrada, biblioteca, salida):
+    relativa = os.path.relpath(entrada, biblioteca)
+    carpeta, nombre = os.path.split(relativa)
+    return os.path.join(salida, carpeta, f"REDUCED_{nombre}")
+
+
+def pendiente(registro, tamano, mtime, leer_hash, max_intentos):
+    """
+    Decide si una entrada debe procesarse según su último registro.
+    leer_hash() solo se llama si tamaño/mtime cambiaron (archivo tocado o copiado).
+    Una entrada 'ok' cuya salida ya no existe se vuelve a procesar.
+    """
+    if registro is None:
+        return True
+    if registro['estado'] == 'ok':
+        if not os.path.exists(registro['salida']):
+            # La salida se perdió (borrada o un corte antes de llegar a disco)
+            return True
+        if registro['tamano'] == tamano and registro['mtime'] == mtime:
+            return False
+        return leer_hash() != registro['hash']
+    # Fallido: reintentar mientras queden intentos (o si el archivo cambió)
+    if registro['tamano'] != tamano or registro['mtime'] != mtime:
+        return True
+    return registro.get('intentos', 1) < max_intentos
+
+
+def reducir_archivo(entrada, salida):
+    """Reduce un archivo y lo escribe de forma atómica. Retorna el hash de la entrada"""
+    with open(entrada, 'rb') as f:
+        data = f.read()
+    hash_entrada = hash_contenido(data)
+
+    if os.path.splitext(entrada)[1].lower() == '.mid':
+        resultado = reduce_midi_bytes(data)
+    else:
+        resultado = reduce_chart_text(data.decode('utf-8')).encode('utf-8')
+
+    os.makedirs(os.path.dirname(salida) or '.', exist_ok=True)
+    temporal = salida + '.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(resultado)
+    os.replace(temporal, salida)
+    # El fsync de la salida lo hace el journal por lotes (Journal.sincronizar)
+    return hash_entrada
+
+
+def sincronizar_archivo(ruta):
+    """fsync de un archivo o carpeta (la de carpetas no está disponible en Windows: se ignora)"""
+    try:
+        fd = os.open(ruta, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _error_de(e):
+    return str(e) or type(e).__name__
+
+
+def reducir_en_pool(trabajos, workers, biblioteca, salida, registrar):
+    """
+    Reduce los trabajos en un pool de procesos y registra cada resultado.
+    Si un worker muere (OOM, segfault) el pool entero se rompe y los trabajos
+    sin terminar NO se registran ni cuentan como intento: no es un fallo suyo.
+    Retorna (trabajos interrumpidos, número de trabajos registrados)
+    """
+    interrumpidos = set()
+    sin_enviar = []
+    completados = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {}
+        for i, trabajo in enumerate(trabajos):
+            entrada = trabajo[0]
+            try:
+                futuro = pool.submit(reducir_archivo, entrada, ruta_de_salida(entrada, biblioteca, salida))
+            except BrokenProcessPool:
+                # El pool se rompió mientras aún se enviaban trabajos
+                sin_enviar = trabajos[i:]
+                break
+            futuros[futuro] = trabajo
+        for futuro in as_completed(futuros):
+            try:
+                hash_entrada, error = futuro.result(), None
+            except BrokenProcessPool:
+                interrumpidos.add(futuro)
+                continue
+            except Exception as e:
+                hash_entrada, error = None, _error_de(e)
+            registrar(*futuros[futuro], hash_entrada, error)
+            completados += 1
+    return [trabajo for futuro, trabajo in futuros.items() if futuro in interrumpidos] + sin_enviar, completados
+
+
+def reducir_aislado(trabajo, biblioteca, salida, registrar):
+    """
+    Reduce un solo trabajo en su propio worker. Si aun así el worker muere, el
+    fallo es del archivo y se registra como error (cuenta como intento).
+    """
+    entrada = trabajo[0]
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            hash_entrada, error = pool.submit(reducir_archivo, entrada,
+                                              ruta_de_salida(entrada, biblioteca, salida)).result(), None
+        except Exception as e:
+            hash_entrada, error = None, _error_de(e)
+    registrar(*trabajo, hash_entrada, error)
+
+
+def procesar_biblioteca(biblioteca, salida, ruta_journal=JOURNAL_DEFECTO, workers=None,
+                        max_intentos=MAX_INTENTOS, log=print):
+    """
+    Procesa toda la biblioteca retomando desde el journal.
+    Retorna {'ok': n, 'error': n, 'omitidos': n}
+    """
+    journal = Journal(ruta_journal)
+    resumen = {'ok': 0, 'error': 0, 'omitidos': 0}
+
+    # Decidir qué falta por hacer
+    trabajos = []
+    for entrada in buscar_canciones(biblioteca):
+        clave = os.path.abspath(entrada)
+        estado = os.stat(entrada)
+        registro = journal.registros.get(clave)
+
+        def leer_hash(ruta=entrada):
+            with open(ruta, 'rb') as f:
+                return hash_contenido(f.read())
+
+        if pendiente(registro, estado.st_size, estado.st_mtime_ns, leer_hash, max_intentos):
+            intentos_previos = registro.get('intentos', 0) if registro and registro['estado'] == 'error' else 0
+            trabajos.append((entrada, clave, estado, intentos_previos))
+        else:
+            resumen['omitidos'] += 1
+
+    log(f"📚 {len(trabajos)} archivos por procesar ({resumen['omitidos']} ya completados)")
+
+    def registrar(entrada, clave, estado, intentos_previos, hash_entrada, error):
+        journal.registrar({
+            'entrada': clave,
+            'tamano': estado.st_size,
+            'mtime': estado.st_mtime_ns,
+            'hash': hash_entrada,
+            'salida': os.path.abspath(ruta_de_salida(entrada, biblioteca, salida)),
+            'estado': 'error' if error else 'ok',
+            'intentos': intentos_previos + 1 if error else 1,
+            'error': error,
+        })
+        if error:
+            resumen['error'] += 1
+            log(f"❌ {entrada}: {error}")
+        else:
+            resumen['ok'] += 1
+
+    try:
+        if workers and workers > 1:
+            restantes = trabajos
+            while restantes:
+                restantes, completados = reducir_en_pool(restantes, workers, biblioteca, salida, registrar)
+                if restantes and not completados:
+                    # El pool se rompió sin avanzar: aislar el primero por si es el que tumba al worker
+                    reducir_aislado(restantes[0], biblioteca, salida, registrar)
+                    restantes = restantes[1:]
+                if restantes:
+                    log(f"♻️ Un worker terminó de forma abrupta, reiniciando pool ({len(restantes)} archivos pendientes)")
+        else:
+            for trabajo in trabajos:
+                entrada = trabajo[0]
+                try:
+                    hash_entrada, error = reducir_archivo(entrada, ruta_de_salida(entrada, biblioteca, salida)), None
+                except Exception as e:
+                    hash_entrada, error = None, _error_de(e)
+                registrar(*trabajo, hash_entrada, error)
+    finally:
+        journal.cerrar()
+
+    log(f"✅ {resumen['ok']} reducidos, ❌ {resumen['error']} con error, ⏭️ {resumen['omitidos']} omitidos")
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reducción por lotes con journal de checkpoints")
+    parser.add_argument('biblioteca')
+    parser.add_argument('salida')
+    parser.add_argument('--journal', default=JOURNAL_DEFECTO)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-intentos', type=int, default=MAX_INTENTOS)
+    args = parser.parse_args()
+
+    procesar_biblioteca(args.biblioteca, args.salida, args.journal,
+                        workers=args.workers, max_intentos=args.max_intentos)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+except ImportError:
+    # Sin Tk (servidor, lotes en un servidor sin entorno gráfico): el núcleo
+    # de parseo/reducción funciona igual, solo la interfaz no está disponible
+    tk = filedialog = messagebox = ttk = None
+import io
 import os
 import subprocess
 import time
 import struct
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import contenedores
 
 # --- CONFIGURACIÓN ---
 INSTRUMENTOS = {
@@ -23,6 +33,8 @@ RANGOS_NOTAS_MIDI = {
     'Easy': 60     # 60-64
 }
 
+NOTA_STAR_POWER = 116  # Frase de Star Power en MIDI ('S 2' en .chart)
+
 NOMBRES_PISTA_MIDI = {
     'Single': 'PART GUITAR',
     'DoubleBass': 'PART BASS',
@@ -52,96 +64,80 @@ def leer_variable_length(data, pos):
             break
     return value, pos
 
-def leer_midi_completo(ruta_archivo):
+def leer_midi_completo(ruta_archivo, workers=None):
     """
     Lee archivo MIDI completo y separa las pistas.
+    ruta_archivo puede ser un .mid o un contenedor .sng/.zip (ver contenedores.py).
+    workers: procesos para parsear las pistas en paralelo (None = en serie)
+    Retorna: (header_bytes, lista_pistas, dict_instrumentos_parseados, ticks_per_beat)
+    """
+    try:
+        data = contenedores.leer_bytes(ruta_archivo)
+    except Exception as e:
+        print(f"Error leyendo MIDI: {e}")
+        return None, None, None, 192
+    
+    return leer_midi_bytes(data, workers)
+
+def indexar_pistas_midi(data):
+    """
+    Localiza header y pistas SIN parsear eventos.
+    Retorna: (header_bytes, ticks_per_beat, [(inicio_pista, fin_pista), ...]) o None si no es MIDI.
+    data[inicio_pista:fin_pista] es la pista completa (con header MTrk); los datos de
+    eventos empiezan en inicio_pista + 8.
+    """
+    pos = 0
+    
+    # Leer header
+    if data[pos:pos+4] != b"MThd":
+        return None
+    
+    pos += 4
+    header_length = int.from_bytes(data[pos:pos+4], 'big')
+    pos += 4
+    header_bytes = bytes(data[pos-8:pos+header_length])
+    
+    ticks_per_beat = int.from_bytes(data[pos+4:pos+6], 'big')
+    pos += header_length
+    
+    # Localizar cada pista completa
+    rangos_pistas = []
+    
+    while pos < len(data) - 8:
+        if data[pos:pos+4] == b"MTrk":
+            track_length = int.from_bytes(data[pos+4:pos+8], 'big')
+            rangos_pistas.append((pos, min(pos + 8 + track_length, len(data))))
+            pos += 8 + track_length
+        else:
+            pos += 1
+    
+    return header_bytes, ticks_per_beat, rangos_pistas
+
+def leer_midi_bytes(data, workers=None):
+    """
+    Igual que leer_midi_completo pero sobre los bytes del MIDI (sin tocar disco).
     Retorna: (header_bytes, lista_pistas, dict_instrumentos_parseados, ticks_per_beat)
     """
     try:
-        with open(ruta_archivo, "rb") as f:
-            data = f.read()
+        indice = indexar_pistas_midi(data)
+        if indice is None:
+            return None, None, None, 192
+        header_bytes, ticks_per_beat, rangos_pistas = indice
         
-        pos = 0
+        # Pistas completas (bytes originales)
+        pistas = [data[inicio:fin] for inicio, fin in rangos_pistas]
         
-        # Leer header
-        if data[pos:pos+4] != b"MThd":
-            return None, None, None, 192
+        # Solo las pistas de instrumentos (por nombre, sin decodificar): VOCALS, EVENTS,
+        # VENUE... no se envían a los workers
+        datos_pistas = [pista[8:] for pista in pistas
+                        if instrumento_de_pista(leer_nombre_pista(pista[8:]))]
         
-        pos += 4
-        header_length = int.from_bytes(data[pos:pos+4], 'big')
-        pos += 4
-        header_bytes = data[pos-8:pos+header_length]
-        
-        format_type = int.from_bytes(data[pos:pos+2], 'big')
-        num_tracks = int.from_bytes(data[pos+2:pos+4], 'big')
-        ticks_per_beat = int.from_bytes(data[pos+4:pos+6], 'big')
-        pos += header_length
-        
-        # Leer cada pista completa
-        pistas = []
-        instrumentos_parseados = {}
-        
-        while pos < len(data) - 8:
-            if data[pos:pos+4] == b"MTrk":
-                pos += 4
-                track_length = int.from_bytes(data[pos:pos+4], 'big')
-                pos += 4
-                track_data = data[pos:pos+track_length]
-                pos += track_length
-                
-                # Guardar pista completa (bytes originales)
-                track_completo = b"MTrk" + struct.pack(">I", track_length) + track_data
-                pistas.append(track_completo)
-                
-                # Parsear para identificar instrumento
-                nombre_pista, notas = parsear_pista_midi(track_data, ticks_per_beat)
-                
-                # Identificar si es un instrumento conocido
-                inst_code = None
-                for code, nombre_midi in NOMBRES_PISTA_MIDI.items():
-                    if nombre_pista and nombre_midi in nombre_pista.upper():
-                        inst_code = code
-                        break
-                
-                # Detectar y SEPARAR notas por dificultad
-                if inst_code and notas:
-                    # SEPARAR todas las notas por rango MIDI
-                    notas_expert = [(t, n, d) for t, n, d in notas if 96 <= n <= 100]
-                    notas_hard = [(t, n, d) for t, n, d in notas if 84 <= n <= 88]
-                    notas_medium = [(t, n, d) for t, n, d in notas if 72 <= n <= 76]
-                    notas_easy = [(t, n, d) for t, n, d in notas if 60 <= n <= 64]
-                    notas_especiales = [(t, n) for t, n, d in notas if n < 60 or (n > 64 and n < 72) or (n > 76 and n < 84) or (n > 88 and n < 96) or n > 100]
-                    
-                    # Si tiene al menos Expert O alguna dificultad, procesar
-                    if notas_expert or notas_hard or notas_medium or notas_easy:
-                        if inst_code not in instrumentos_parseados:
-                            instrumentos_parseados[inst_code] = {
-                                'notas_especiales': notas_especiales  # PRESERVAR eventos especiales
-                            }
-                        
-                        # Procesar Expert (siempre necesario para generar las otras)
-                        if notas_expert:
-                            from collections import defaultdict
-                            notas_por_tick = defaultdict(list)
-                            for tick, nota_midi, duracion in notas_expert:
-                                fret = nota_midi - 96  # Expert usa 96-100
-                                notas_por_tick[tick].append((fret, duracion))
-                            
-                            # Convertir a formato (tick, fret, duration)
-                            notas_fret = []
-                            for tick in sorted(notas_por_tick.keys()):
-                                for fret, duracion in notas_por_tick[tick]:
-                                    notas_fret.append((tick, fret, duracion))
-                            
-                            instrumentos_parseados[inst_code]['Expert'] = notas_fret
-                        
-                        # Si NO tiene Expert pero tiene otras dificultades, avisar
-                        elif notas_hard or notas_medium or notas_easy:
-                            # Este instrumento tiene dificultades pero no Expert
-                            # No podemos regenerar sin Expert
-                            pass
-            else:
-                pos += 1
+        # Parsear cada pista (en paralelo si se pidió) y combinar EN ORDEN de pista
+        clasificadas = ejecutar_en_pool(clasificar_pista_midi,
+                                        [(track_data, ticks_per_beat) for track_data in datos_pistas],
+                                        workers)
+        
+        instrumentos_parseados = combinar_pistas_clasificadas(clasificadas)
         
         return header_bytes, pistas, instrumentos_parseados, ticks_per_beat
         
@@ -151,6 +147,223 @@ def leer_midi_completo(ruta_archivo):
         traceback.print_exc()
         return None, None, None, 192
 
+def combinar_pistas_clasificadas(clasificadas):
+    """Combina EN ORDEN de pista los resultados de clasificar_pista_midi. Retorna {inst_code: data}"""
+    instrumentos_parseados = {}
+    for clasificada in clasificadas:
+        if clasificada is None:
+            continue
+        inst_code, notas_especiales, notas_fret = clasificada
+        
+        if inst_code not in instrumentos_parseados:
+            instrumentos_parseados[inst_code] = {
+                'notas_especiales': notas_especiales  # PRESERVAR eventos especiales
+            }
+        
+        # Expert (siempre necesario para generar las otras)
+        if notas_fret:
+            instrumentos_parseados[inst_code]['Expert'] = notas_fret
+    
+    return instrumentos_parseados
+
+def eventos_pista_midi(track_data):
+    """
+    Recorre los eventos de una pista (sin header MTrk): único lector de eventos MIDI del módulo.
+    Genera (tick, status, dato1, dato2):
+      - canal (0x80-0xEF): dato1 = nota/controlador, dato2 = velocity/valor (0 en eventos de 1 byte)
+      - meta (0xFF): dato1 = tipo, dato2 = contenido
+      - SysEx (0xF0/0xF7): dato1 = None, dato2 = contenido
+    El running status solo lo fijan los eventos de canal. Se detiene si la pista está truncada.
+    """
+    pos = 0
+    fin = len(track_data)
+    tiempo_absoluto = 0
+    running_status = 0
+    
+    while pos < fin:
+        delta_time, pos = leer_variable_length(track_data, pos)
+        tiempo_absoluto += delta_time
+        if pos >= fin:
+            return
+        
+        status = track_data[pos]
+        if status < 0x80:
+            status = running_status
+        else:
+            pos += 1
+            if status < 0xF0:
+                running_status = status
+        
+        if 0x80 <= status <= 0xEF:
+            if 0xC0 <= status <= 0xDF:
+                if pos >= fin:
+                    return
+                yield tiempo_absoluto, status, track_data[pos], 0
+                pos += 1
+            else:
+                if pos + 1 >= fin:
+                    return
+                yield tiempo_absoluto, status, track_data[pos], track_data[pos + 1]
+                pos += 2
+        elif status == 0xFF:
+            if pos >= fin:
+                return
+            meta_type = track_data[pos]
+            length, pos = leer_variable_length(track_data, pos + 1)
+            yield tiempo_absoluto, status, meta_type, track_data[pos:pos+length]
+            pos += length
+        elif status == 0xF0 or status == 0xF7:
+            length, pos = leer_variable_length(track_data, pos)
+            yield tiempo_absoluto, status, None, track_data[pos:pos+length]
+            pos += length
+        else:
+            pos += 1
+
+def leer_nombre_pista(track_data):
+    """
+    Nombre de la pista (primer meta evento Track Name) SIN decodificar notas.
+    Recorre eventos solo hasta encontrarlo (normalmente es el primero).
+    """
+    for _, status, meta_type, contenido in eventos_pista_midi(track_data):
+        if status == 0xFF and meta_type == 0x03 and contenido:
+            return bytes(contenido).decode('latin-1', errors='ignore')
+    return None
+
+def instrumento_de_pista(nombre_pista):
+    """inst_code cuyo nombre MIDI aparece en el nombre de la pista (o None)"""
+    for code, nombre_midi in NOMBRES_PISTA_MIDI.items():
+        if nombre_pista and nombre_midi in nombre_pista.upper():
+            return code
+    return None
+
+class InstrumentosMidiPerezosos(Mapping):
+    """
+    {inst_code: data} como el de leer_midi_bytes, pero cada instrumento se
+    decodifica la primera vez que se accede a él (y se memoriza). Al cargar
+    solo se indexan los nombres de pista.
+    """
+    
+    def __init__(self, pistas, ticks_per_beat):
+        self.pistas = pistas
+        self.ticks_per_beat = ticks_per_beat
+        self.decodificados = {}
+        
+        # {inst_code: [índices de pista]} en orden de aparición
+        self.pistas_por_instrumento = {}
+        for idx, pista in enumerate(pistas):
+            inst_code = instrumento_de_pista(leer_nombre_pista(pista[8:]))
+            if inst_code:
+                self.pistas_por_instrumento.setdefault(inst_code, []).append(idx)
+    
+    def __getitem__(self, inst_code):
+        if inst_code not in self.decodificados:
+            clasificadas = [clasificar_pista_midi(self.pistas[idx][8:], self.ticks_per_beat)
+                            for idx in self.pistas_por_instrumento[inst_code]]
+            self.decodificados[inst_code] = combinar_pistas_clasificadas(clasificadas).get(inst_code, {})
+        return self.decodificados[inst_code]
+    
+    def __iter__(self):
+        return iter(self.pistas_por_instrumento)
+    
+    def __len__(self):
+        return len(self.pistas_por_instrumento)
+    
+    def decodificado(self, inst_code):
+        return inst_code in self.decodificados
+    
+    def decodificar_todos(self, workers=None):
+        """Decodifica los instrumentos pendientes (en paralelo si se pide)"""
+        pendientes = [inst_code for inst_code in self.pistas_por_instrumento if inst_code not in self.decodificados]
+        trabajos = [(inst_code, idx) for inst_code in pendientes for idx in self.pistas_por_instrumento[inst_code]]
+        clasificadas = ejecutar_en_pool(clasificar_pista_midi,
+                                        [(self.pistas[idx][8:], self.ticks_per_beat) for _, idx in trabajos],
+                                        workers)
+        for inst_code in pendientes:
+            clasificadas_inst = [c for (codigo, _), c in zip(trabajos, clasificadas) if codigo == inst_code]
+            self.decodificados[inst_code] = combinar_pistas_clasificadas(clasificadas_inst).get(inst_code, {})
+
+def leer_midi_indexado(ruta_archivo):
+    """
+    Como leer_midi_completo pero SIN decodificar notas: solo indexa pistas y nombres.
+    Retorna: (header_bytes, lista_pistas, InstrumentosMidiPerezosos, ticks_per_beat)
+    """
+    try:
+        data = contenedores.leer_bytes(ruta_archivo)
+        
+        indice = indexar_pistas_midi(data)
+        if indice is None:
+            return None, None, None, 192
+        header_bytes, ticks_per_beat, rangos_pistas = indice
+        
+        pistas = [data[inicio:fin] for inicio, fin in rangos_pistas]
+        return header_bytes, pistas, InstrumentosMidiPerezosos(pistas, ticks_per_beat), ticks_per_beat
+        
+    except Exception as e:
+        print(f"Error leyendo MIDI: {e}")
+        import traceback
+        traceback.print_exc()
+        return None, None, None, 192
+
+def clasificar_pista_midi(track_data, ticks_per_beat):
+    """
+    Parsea una pista e identifica si es un instrumento conocido.
+    Retorna None si no lo es (o no tiene notas de ninguna dificultad), o
+    (inst_code, notas_especiales, notas_expert_fret) con notas_expert_fret
+    en formato [(tick, fret, duration), ...] (vacía si no hay Expert) y
+    notas_especiales en formato [(tick, nota_midi, duration), ...].
+    """
+    from collections import defaultdict
+    
+    # Identificar si es un instrumento conocido (sin decodificar notas si no lo es)
+    inst_code = instrumento_de_pista(leer_nombre_pista(track_data))
+    if not inst_code:
+        return None
+    
+    _, notas = parsear_pista_midi(track_data, ticks_per_beat)
+    
+    if not notas:
+        return None
+    
+    # SEPARAR todas las notas por rango MIDI
+    notas_expert = [(t, n, d) for t, n, d in notas if 96 <= n <= 100]
+    hay_otras = any(84 <= n <= 88 or 72 <= n <= 76 or 60 <= n <= 64 for t, n, d in notas)
+    notas_especiales = [(t, n, d) for t, n, d in notas if n < 60 or (n > 64 and n < 72) or (n > 76 and n < 84) or (n > 88 and n < 96) or n > 100]
+    
+    # Si NO tiene Expert ni otras dificultades, no es un instrumento procesable
+    # (sin Expert no podemos regenerar, pero se reporta igualmente)
+    if not notas_expert and not hay_otras:
+        return None
+    
+    notas_por_tick = defaultdict(list)
+    for tick, nota_midi, duracion in notas_expert:
+        fret = nota_midi - 96  # Expert usa 96-100
+        notas_por_tick[tick].append((fret, duracion))
+    
+    # Convertir a formato (tick, fret, duration)
+    notas_fret = []
+    for tick in sorted(notas_por_tick.keys()):
+        for fret, duracion in notas_por_tick[tick]:
+            notas_fret.append((tick, fret, duracion))
+    
+    return inst_code, notas_especiales, notas_fret
+
+def _llamar_con_args(args):
+    funcion, argumentos = args
+    return funcion(*argumentos)
+
+def ejecutar_en_pool(funcion, lista_argumentos, workers=None):
+    """
+    Ejecuta funcion(*args) para cada tupla de lista_argumentos y retorna los
+    resultados EN EL MISMO ORDEN. Con workers > 1 usa un pool de procesos;
+    el resultado es idéntico al de la ejecución en serie.
+    """
+    if not workers or workers <= 1 or len(lista_argumentos) <= 1:
+        return [funcion(*argumentos) for argumentos in lista_argumentos]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(workers, len(lista_argumentos))) as pool:
+        return list(pool.map(_llamar_con_args, [(funcion, argumentos) for argumentos in lista_argumentos]))
+
 def parsear_pista_midi(track_data, ticks_per_beat):
     """
     Parsea una pista MIDI para extraer nombre y notas CON DURACIONES.
@@ -162,86 +375,24 @@ def parsear_pista_midi(track_data, ticks_per_beat):
     
     # Trackear Note On activos para calcular duraciones
     notas_activas = {}  # {nota_midi: tick_inicio}
-    
-    pos = 0
     tiempo_absoluto = 0
-    running_status = 0
     
-    while pos < len(track_data):
-        try:
-            delta_time, pos = leer_variable_length(track_data, pos)
-            tiempo_absoluto += delta_time
-            
-            if pos >= len(track_data):
-                break
-            
-            status = track_data[pos]
-            if status < 0x80:
-                status = running_status
-            else:
-                pos += 1
-                running_status = status
-            
-            # Note On
-            if 0x90 <= status <= 0x9F:
-                if pos + 1 < len(track_data):
-                    note = track_data[pos]
-                    velocity = track_data[pos + 1]
-                    pos += 2
-                    if velocity > 0:
-                        # Registrar Note On
-                        notas_activas[note] = tiempo_absoluto
-                    else:
-                        # Note On con velocity 0 = Note Off
-                        if note in notas_activas:
-                            tick_inicio = notas_activas[note]
-                            duracion = tiempo_absoluto - tick_inicio
-                            notas_con_duracion.append((tick_inicio, note, duracion))
-                            del notas_activas[note]
-            
-            # Note Off
-            elif 0x80 <= status <= 0x8F:
-                if pos + 1 < len(track_data):
-                    note = track_data[pos]
-                    pos += 2
-                    # Calcular duración
-                    if note in notas_activas:
-                        tick_inicio = notas_activas[note]
-                        duracion = tiempo_absoluto - tick_inicio
-                        notas_con_duracion.append((tick_inicio, note, duracion))
-                        del notas_activas[note]
-                else:
-                    pos += 0
-            elif 0xA0 <= status <= 0xBF:
-                pos += 2 if pos + 1 < len(track_data) else 0
-            elif 0xC0 <= status <= 0xDF:
-                pos += 1 if pos < len(track_data) else 0
-            elif 0xE0 <= status <= 0xEF:
-                pos += 2 if pos + 1 < len(track_data) else 0
-            
-            # Meta events
-            elif status == 0xFF:
-                if pos < len(track_data):
-                    meta_type = track_data[pos]
-                    pos += 1
-                    length, pos = leer_variable_length(track_data, pos)
-                    
-                    # Track Name (0x03)
-                    if meta_type == 0x03 and length > 0:
-                        try:
-                            nombre_bytes = track_data[pos:pos+length]
-                            nombre_pista = nombre_bytes.decode('latin-1', errors='ignore')
-                        except:
-                            pass
-                    
-                    pos += length
-            elif status == 0xF0 or status == 0xF7:
-                length, pos = leer_variable_length(track_data, pos)
-                pos += length
-            else:
-                pos += 1
-        except:
-            pos += 1
+    for tiempo_absoluto, status, dato1, dato2 in eventos_pista_midi(track_data):
+        tipo = status & 0xF0
+        
+        # Note On (velocity 0 = Note Off)
+        if tipo == 0x90 and dato2 > 0:
+            notas_activas[dato1] = tiempo_absoluto
+        
+        # Note Off: calcular duración
+        elif tipo == 0x80 or tipo == 0x90:
+            tick_inicio = notas_activas.pop(dato1, None)
+            if tick_inicio is not None:
+                notas_con_duracion.append((tick_inicio, dato1, tiempo_absoluto - tick_inicio))
+        
+        # Track Name (0x03)
+        elif status == 0xFF and dato1 == 0x03 and dato2:
+            nombre_pista = bytes(dato2).decode('latin-1', errors='ignore')
     
     # Cerrar notas que quedaron abiertas (asignar duración mínima)
     for note, tick_inicio in notas_activas.items():
@@ -295,32 +446,55 @@ def crear_pista_midi(nombre_pista, notas, base_nota, ticks_per_beat):
     
     return track_completo
 
-def guardar_midi(ruta, header_bytes, pistas_originales, nuevas_pistas, num_tracks_total):
+def midi_a_bytes(header_bytes, pistas_originales, nuevas_pistas, num_tracks_total):
+    """
+    Serializa un MIDI con las pistas originales + nuevas pistas.
+    """
+    salida = bytearray()
+    
+    # Header con número actualizado de pistas
+    salida.extend(b"MThd")
+    salida.extend(struct.pack(">I", 6))  # Header length
+    
+    # Extraer format y division del header original
+    format_type = int.from_bytes(header_bytes[8:10], 'big')
+    division = header_bytes[12:14]
+    
+    salida.extend(struct.pack(">H", format_type))
+    salida.extend(struct.pack(">H", num_tracks_total))
+    salida.extend(division)
+    
+    # Pistas originales
+    for pista in pistas_originales:
+        salida.extend(pista)
+    
+    # Nuevas pistas
+    for pista in nuevas_pistas:
+        salida.extend(pista)
+    
+    return bytes(salida)
+
+def guardar_midi(ruta, header_bytes, pistas_originales, nuevas_pistas, num_tracks_total, origen=None):
     """
     Guarda archivo MIDI con las pistas originales + nuevas pistas.
+    Si ruta es un .sng/.zip, crea un contenedor copiando el resto de miembros de 'origen'
+    (obligatorio en ese caso: ValueError si falta).
     """
+    data = midi_a_bytes(header_bytes, pistas_originales, nuevas_pistas, num_tracks_total)
+    if contenedores.es_contenedor(ruta):
+        contenedores.escribir_contenedor(ruta, origen, data, '.mid')
+        return
     with open(ruta, 'wb') as f:
-        # Escribir header con número actualizado de pistas
-        f.write(b"MThd")
-        f.write(struct.pack(">I", 6))  # Header length
-        
-        # Extraer format y division del header original
-        format_type = int.from_bytes(header_bytes[8:10], 'big')
-        division = header_bytes[12:14]
-        
-        f.write(struct.pack(">H", format_type))
-        f.write(struct.pack(">H", num_tracks_total))
-        f.write(division)
-        
-        # Escribir pistas originales
-        for pista in pistas_originales:
-            f.write(pista)
-        
-        # Escribir nuevas pistas
-        for pista in nuevas_pistas:
-            f.write(pista)
+        f.write(data)
 
 # --- PARSER CHART ---
+def leer_lineas_chart(ruta):
+    """Líneas de un .chart (archivo normal o dentro de un contenedor .sng/.zip)"""
+    if contenedores.es_contenedor(ruta):
+        return io.TextIOWrapper(io.BytesIO(contenedores.leer_bytes(ruta)), encoding='utf-8').readlines()
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return f.readlines()
+
 def detectar_instrumentos_chart(lineas):
     """Detecta instrumentos en archivo .chart"""
     instrumentos = {}
@@ -367,52 +541,129 @@ def detectar_instrumentos_chart(lineas):
                     instrumentos[inst_actual][diff_actual].append((tick, fret, duration))
                 except:
                     continue
+            elif (len(partes) >= 5 and partes[1] == '=' and partes[2] == 'S' and partes[3] == '2'
+                  and diff_actual == 'Expert'):
+                # Frase de Star Power (con su duración) → mismo formato que la nota MIDI 116
+                try:
+                    frase = (int(partes[0]), NOTA_STAR_POWER, int(partes[4]))
+                    instrumentos[inst_actual].setdefault('notas_especiales', []).append(frase)
+                except:
+                    continue
     
     return instrumentos
 
-# --- REDUCCIÓN MEJORADA ---
-def aplicar_reduccion_adaptativa(notas_expert, dificultad, ticks_per_beat, star_power_ticks=[]):
+# --- CONFIGURACIÓN DE REDUCCIÓN ---
+# Multiplicadores del espaciado mediano para cada dificultad
+# Valores más bajos = MÁS notas (filtro más permisivo)
+# Valores más altos = MENOS notas (filtro más estricto)
+SPACING_MULTIPLIER = {
+    'Hard': 1.01,    # ~60-65% de notas (muy ligeramente más espaciado que Expert)
+    'Medium': 2.00,  # ~50% de notas (doble espaciado)
+    'Easy': 3.33     # ~30% de notas (triple espaciado)
+}
+
+# Máximo fret permitido (0=G, 1=R, 2=Y, 3=B, 4=O)
+MAX_FRET = {
+    'Hard': 4,    # G,R,Y,B,O (5 botones)
+    'Medium': 3,  # G,R,Y,B (4 botones)
+    'Easy': 2     # G,R,Y (3 botones)
+}
+
+# Máximo de notas simultáneas (acordes)
+MAX_CHORD_SIZE = {
+    'Hard': 2,    # Máximo 2 notas
+    'Medium': 1,  # Solo notas simples
+    'Easy': 1     # Solo notas simples
+}
+
+# Frets representables en un acorde: 0-4 (G,R,Y,B,O) + 5-7 (forced/tap/open en .chart)
+NUM_FRETS_MASCARA = 8
+
+# --- ACORDES COMO BITMASK ---
+def mascara_acorde(notas):
+    """Convierte [(fret, duracion), ...] a bitmask de frets (bit n = fret n)"""
+    mascara = 0
+    for fret, _ in notas:
+        if 0 <= fret < NUM_FRETS_MASCARA:
+            mascara |= 1 << fret
+    return mascara
+
+def frets_de_mascara(mascara):
+    """Lista de frets (ascendente) presentes en la bitmask"""
+    return [fret for fret in range(NUM_FRETS_MASCARA) if mascara & (1 << fret)]
+
+def reducir_mascara(mascara, max_notas):
     """
-    Reduce notas según dificultad con algoritmo ADAPTATIVO basado en densidad de Expert.
-    
-    - Hard: ~60-65% densidad, 5 botones, acordes máx 2 notas
-    - Medium: ~50% densidad, 4 botones, notas simples
-    - Easy: ~30% densidad, 3 botones, notas simples
-    
-    PRESERVA Star Power en sus posiciones originales.
+    Reduce una forma de acorde (bitmask) a máximo 'max_notas' frets.
+    Misma estrategia que reducir_acorde: 1 nota → la más baja,
+    2 notas → el par consecutivo MÁS CERCANO (el más bajo si hay empate).
     """
-    from collections import defaultdict
-    import math
-    
-    # Multiplicadores del espaciado mediano para cada dificultad
-    # Valores más bajos = MÁS notas (filtro más permisivo)
-    # Valores más altos = MENOS notas (filtro más estricto)
-    SPACING_MULTIPLIER = {
-        'Hard': 1.01,    # ~60-65% de notas (muy ligeramente más espaciado que Expert)
-        'Medium': 2.00,  # ~50% de notas (doble espaciado)
-        'Easy': 3.33     # ~30% de notas (triple espaciado)
-    }
+    frets = frets_de_mascara(mascara)
+    if len(frets) <= max_notas:
+        return mascara
     
-    # Máximo fret permitido (0=G, 1=R, 2=Y, 3=B, 4=O)
-    MAX_FRET = {
-        'Hard': 4,    # G,R,Y,B,O (5 botones)
-        'Medium': 3,  # G,R,Y,B (4 botones)
-        'Easy': 2     # G,R,Y (3 botones)
-    }
+    if max_notas == 1:
+        elegidos = frets[:1]
+    elif max_notas == 2:
+        elegidos = frets[:2]
+        menor_separacion = float('inf')
+        for i in range(len(frets) - 1):
+            separacion = frets[i + 1] - frets[i]
+            if separacion < menor_separacion:
+                menor_separacion = separacion
+                elegidos = frets[i:i + 2]
+    else:
+        elegidos = frets[:max_notas]
     
-    # Máximo de notas simultáneas (acordes)
-    MAX_CHORD_SIZE = {
-        'Hard': 2,    # Máximo 2 notas
-        'Medium': 1,  # Solo notas simples
-        'Easy': 1     # Solo notas simples
+    return mascara_acorde([(fret, 0) for fret in elegidos])
+
+def construir_tabla_reduccion(limite_fret, max_chord):
+    """
+    Precalcula la reducción de TODAS las formas de acorde posibles.
+    tabla[mascara_expert] = mascara_reducida (0 si no queda ningún fret válido)
+    """
+    mascara_validos = (1 << (limite_fret + 1)) - 1
+    return [reducir_mascara(mascara & mascara_validos, max_chord)
+            for mascara in range(1 << NUM_FRETS_MASCARA)]
+
+def construir_tablas_reduccion():
+    """Tablas de reducción por dificultad según MAX_FRET y MAX_CHORD_SIZE"""
+    return {
+        diff: construir_tabla_reduccion(MAX_FRET[diff], MAX_CHORD_SIZE[diff])
+        for diff in MAX_FRET
     }
-    
-    spacing_mult = SPACING_MULTIPLIER.get(dificultad, 1.0)
-    limite_fret = MAX_FRET.get(dificultad, 4)
-    max_chord = MAX_CHORD_SIZE.get(dificultad, 2)
-    
-    # Convertir star_power_ticks a set para búsqueda rápida
-    star_power_set = set(star_power_ticks)
+
+# {dificultad: tabla} con los límites por defecto
+TABLAS_REDUCCION = construir_tablas_reduccion()
+
+# --- REDUCCIÓN MEJORADA ---
+# {(limite_fret, max_chord): tabla} - incluye las de TABLAS_REDUCCION y las de ajustes en vivo
+_TABLAS_POR_LIMITES = {(MAX_FRET[diff], MAX_CHORD_SIZE[diff]): tabla for diff, tabla in TABLAS_REDUCCION.items()}
+
+def tabla_reduccion(limite_fret, max_chord):
+    """Tabla de reducción para unos límites dados (precalculada y memorizada)"""
+    clave = (limite_fret, max_chord)
+    if clave not in _TABLAS_POR_LIMITES:
+        _TABLAS_POR_LIMITES[clave] = construir_tabla_reduccion(limite_fret, max_chord)
+    return _TABLAS_POR_LIMITES[clave]
+
+def parametros_reduccion(dificultad, parametros=None):
+    """
+    Parámetros efectivos de una dificultad: (spacing_mult, limite_fret, max_chord).
+    parametros: {'spacing_multiplier': x, 'max_fret': n, 'max_chord_size': n} para
+    sobrescribir los valores por defecto (ajuste en vivo desde la interfaz).
+    """
+    parametros = parametros or {}
+    return (parametros.get('spacing_multiplier', SPACING_MULTIPLIER.get(dificultad, 1.0)),
+            parametros.get('max_fret', MAX_FRET.get(dificultad, 4)),
+            parametros.get('max_chord_size', MAX_CHORD_SIZE.get(dificultad, 2)))
+
+def preparar_reduccion(notas_expert):
+    """
+    Agrupa Expert por tick y calcula su espaciado mediano. No depende de la
+    dificultad, así que se reutiliza para todas (y para cada ajuste en vivo).
+    """
+    from collections import defaultdict
     
     # Agrupar por tick para manejar acordes
     notas_por_tick = defaultdict(list)
@@ -420,24 +671,57 @@ def aplicar_reduccion_adaptativa(notas_expert, dificultad, ticks_per_beat, star_
         notas_por_tick[tick].append((fret, duracion))
     
     ticks_ordenados = sorted(notas_por_tick.keys())
+    # Forma de cada acorde como bitmask (paralela a ticks_ordenados): reducir es una consulta de tabla por tick
+    mascaras = [mascara_acorde(notas_por_tick[tick]) for tick in ticks_ordenados]
     
-    # CALCULAR ESPACIADO PROMEDIO en Expert
-    if len(ticks_ordenados) < 2:
-        # Si hay muy pocas notas, usar todo
-        return notas_expert
-    
+    # CALCULAR ESPACIADO MEDIANO en Expert (None = muy pocas notas, usar todo)
     espaciados = []
     for i in range(len(ticks_ordenados) - 1):
         espaciado = ticks_ordenados[i + 1] - ticks_ordenados[i]
         if espaciado > 0:  # Ignorar notas simultáneas
             espaciados.append(espaciado)
     
-    if not espaciados:
-        return notas_expert
+    espaciado_mediano = None
+    if espaciados:
+        # Usar mediana para ser más robusto contra outliers
+        espaciados.sort()
+        espaciado_mediano = espaciados[len(espaciados) // 2]
     
-    # Usar mediana para ser más robusto contra outliers
-    espaciados.sort()
-    espaciado_mediano = espaciados[len(espaciados) // 2]
+    return {
+        'notas_expert': notas_expert,
+        'notas_por_tick': notas_por_tick,
+        'ticks_ordenados': ticks_ordenados,
+        'mascaras': mascaras,
+        'espaciado_mediano': espaciado_mediano,
+    }
+
+def aplicar_reduccion_adaptativa(notas_expert, dificultad, ticks_per_beat, star_power_ticks=[], parametros=None):
+    """
+    Reduce notas según dificultad con algoritmo ADAPTATIVO basado en densidad de Expert.
+    
+    - Hard: ~60-65% densidad, 5 botones, acordes máx 2 notas
+    - Medium: ~50% densidad, 4 botones, notas simples
+    - Easy: ~30% densidad, 3 botones, notas simples
+    
+    PRESERVA Star Power en sus posiciones originales.
+    """
+    return reducir_preparado(preparar_reduccion(notas_expert), dificultad, star_power_ticks, parametros)
+
+def reducir_preparado(preparado, dificultad, star_power_ticks=[], parametros=None):
+    """Reduce una dificultad a partir de preparar_reduccion() (ver aplicar_reduccion_adaptativa)"""
+    spacing_mult, limite_fret, max_chord = parametros_reduccion(dificultad, parametros)
+    tabla = tabla_reduccion(limite_fret, max_chord)
+    mascara_validos = (1 << (limite_fret + 1)) - 1
+    
+    # Convertir star_power_ticks a set para búsqueda rápida
+    star_power_set = set(star_power_ticks)
+    
+    notas_por_tick = preparado['notas_por_tick']
+    espaciado_mediano = preparado['espaciado_mediano']
+    
+    if espaciado_mediano is None:
+        # Si hay muy pocas notas, usar todo
+        return preparado['notas_expert']
     
     # CALCULAR ESPACIADO MÍNIMO basado en multiplicador
     # Hard (1.01x): acepta notas casi tan juntas como Expert
@@ -449,11 +733,11 @@ def aplicar_reduccion_adaptativa(notas_expert, dificultad, ticks_per_beat, star_
     notas_reducidas = []
     last_tick = -999999
     
-    for tick in ticks_ordenados:
-        # 1. Filtrar frets que cumplen el límite
-        frets_validos = [(f, d) for f, d in notas_por_tick[tick] if f <= limite_fret]
+    for tick, mascara in zip(preparado['ticks_ordenados'], preparado['mascaras']):
+        # 1. Reducción del acorde por tabla (límite de fret + tamaño)
+        mascara_reducida = tabla[mascara]
         
-        if not frets_validos:
+        if not mascara_reducida:
             continue
         
         # 2. CRÍTICO: Si este tick tiene Star Power, SIEMPRE incluirlo
@@ -463,13 +747,15 @@ def aplicar_reduccion_adaptativa(notas_expert, dificultad, ticks_per_beat, star_
         if not es_star_power and (tick - last_tick < min_tick_diff):
             continue
         
-        # 4. Reducir acordes si exceden el máximo
-        if len(frets_validos) > max_chord:
-            frets_validos = reducir_acorde(frets_validos, max_chord)
-        
-        # 5. Agregar notas del acorde reducido
-        for fret, duration in frets_validos:
-            notas_reducidas.append((tick, fret, duration))
+        # 4. Agregar notas del acorde reducido (orden original si no se recortó el acorde).
+        #    Una sola nota por fret: si el tick repite un fret se queda la primera
+        notas_tick = notas_por_tick[tick]
+        if mascara_reducida != mascara & mascara_validos:
+            notas_tick = sorted(notas_tick, key=lambda x: x[0])
+        for fret, duration in notas_tick:
+            if 0 <= fret < NUM_FRETS_MASCARA and mascara_reducida & (1 << fret):
+                notas_reducidas.append((tick, fret, duration))
+                mascara_reducida &= ~(1 << fret)
         
         last_tick = tick
     
@@ -488,57 +774,450 @@ def reducir_acorde(notas, max_notas):
     if len(notas) <= max_notas:
         return notas
     
-    # Ordenar por fret
-    notas_ordenadas = sorted(notas, key=lambda x: x[0])
+    mascara_reducida = reducir_mascara(mascara_acorde(notas), max_notas)
     
-    if max_notas == 1:
-        # Para notas simples: elegir la nota más baja (más fundamental)
-        return [notas_ordenadas[0]]
+    resultado = []
+    for fret, duracion in sorted(notas, key=lambda x: x[0]):
+        if 0 <= fret < NUM_FRETS_MASCARA and mascara_reducida & (1 << fret):
+            resultado.append((fret, duracion))
+            mascara_reducida &= ~(1 << fret)
+    return resultado
+
+def crear_seccion_chart(nombre, notas, star_power=()):
+    """Crea sección de chart. star_power: [(tick, duracion), ...] → líneas 'S 2' entre las notas"""
+    if not notas:
+        return ""
     
-    elif max_notas == 2:
-        # Para acordes de 2: encontrar el PAR de notas más CERCANAS (consecutivas)
-        # Esto mantiene acordes únicos y es más fácil de tocar
+    texto = f'\n[{nombre}]\n{{\n'
+    if not star_power:
+        for tick, fret, duration in notas:
+            texto += f'  {tick} = N {fret} {duration}\n'
+    else:
+        # Notas + Star Power ordenados por tick
+        eventos = [(tick, 0, f'N {fret} {duration}') for tick, fret, duration in notas]
+        eventos += [(tick, 1, f'S 2 {duracion}') for tick, duracion in star_power]
+        eventos.sort(key=lambda x: (x[0], x[1]))
+        for tick, _, evento in eventos:
+            texto += f'  {tick} = {evento}\n'
+    texto += '}\n'
+    return texto
+
+def frases_star_power(data):
+    """Frases de Star Power [(tick, duracion), ...] de un instrumento parseado (MIDI o .chart)"""
+    return [(tick, duracion) for tick, nota, duracion in data.get('notas_especiales', [])
+            if nota == NOTA_STAR_POWER]
+
+def ticks_star_power(data):
+    """Ticks de Star Power (nota MIDI 116) de un instrumento parseado"""
+    return [tick for tick, _ in frases_star_power(data)]
+
+def reducir_instrumento(data, ticks_per_beat, parametros=None):
+    """Genera Hard/Medium/Easy a partir del Expert de un instrumento parseado"""
+    star_power_ticks = ticks_star_power(data)
+    preparado = preparar_reduccion(data['Expert'])
+    parametros = parametros or {}
+    return {
+        diff: reducir_preparado(preparado, diff, star_power_ticks, parametros.get(diff))
+        for diff in ['Hard', 'Medium', 'Easy']
+    }
+
+def reducir_instrumentos(instrumentos, ticks_per_beat, workers=None, parametros=None):
+    """
+    Reduce TODOS los instrumentos con Expert. Retorna {inst_code: {diff: notas}}
+    workers: procesos para reducir cada instrumento en paralelo (None = en serie).
+             Un trabajo por instrumento: Expert se agrupa/ordena y se envía al worker una sola vez
+    parametros: {diff: {...}} para sobrescribir los valores por defecto (ver parametros_reduccion)
+    """
+    trabajos = [(inst_code, data) for inst_code, data in instrumentos.items() if 'Expert' in data]
+    resultados = ejecutar_en_pool(reducir_instrumento,
+                                  [(data, ticks_per_beat, parametros) for _, data in trabajos],
+                                  workers)
+    return {inst_code: diffs for (inst_code, _), diffs in zip(trabajos, resultados)}
+
+def crear_pista_multidificultad(nombre_pista, dificultades_dict, eventos_especiales=[]):
+    """
+    Crea una pista MIDI con múltiples dificultades + eventos especiales.
+    dificultades_dict: {'Expert': [(tick, fret, dur), ...], 'Hard': [...], ...}
+    eventos_especiales: [(tick, nota_midi, duracion), ...] - Star Power, etc.
+    """
+    eventos = bytearray()
+    
+    # Track Name
+    nombre_bytes = nombre_pista.encode('latin-1')
+    eventos.extend(b'\x00\xFF\x03')
+    eventos.extend(escribir_variable_length(len(nombre_bytes)))
+    eventos.extend(nombre_bytes)
+    
+    # Recopilar TODOS los eventos MIDI con tick absoluto
+    todos_eventos = []
+    
+    # 1. Agregar eventos de todas las dificultades
+    for diff, notas in dificultades_dict.items():
+        base_nota = RANGOS_NOTAS_MIDI.get(diff, 96)
+        for tick, fret, duration in notas:
+            nota_midi = base_nota + fret
+            dur = duration if duration > 0 else 10
+            
+            # Note On y Note Off como eventos separados
+            todos_eventos.append((tick, 'on', nota_midi))
+            todos_eventos.append((tick + dur, 'off', nota_midi))
+    
+    # 2. Agregar eventos especiales (Star Power, etc.)
+    for tick, nota_midi, duracion in eventos_especiales:
+        dur = duracion if duracion > 0 else 10  # Duración mínima para eventos especiales
+        todos_eventos.append((tick, 'on', nota_midi))
+        todos_eventos.append((tick + dur, 'off', nota_midi))
+    
+    # CRÍTICO: Ordenar TODOS los eventos por tick absoluto
+    # Si hay empate en tick, Note Off va antes que Note On
+    todos_eventos.sort(key=lambda x: (x[0], x[1] == 'on'))
+    
+    # Generar eventos MIDI con deltas correctos
+    ultimo_tick = 0
+    for tick_abs, tipo, nota_midi in todos_eventos:
+        delta = tick_abs - ultimo_tick
+        
+        if tipo == 'on':
+            # Note On
+            eventos.extend(escribir_variable_length(delta))
+            eventos.append(0x90)
+            eventos.append(nota_midi)
+            eventos.append(96)
+        else:
+            # Note Off
+            eventos.extend(escribir_variable_length(delta))
+            eventos.append(0x80)
+            eventos.append(nota_midi)
+            eventos.append(0)
         
-        if len(notas_ordenadas) == 2:
-            return notas_ordenadas
+        ultimo_tick = tick_abs
+    
+    # End of Track
+    eventos.extend(b'\x00\xFF\x2F\x00')
+    
+    # Construir pista completa
+    track_completo = b"MTrk" + struct.pack(">I", len(eventos)) + bytes(eventos)
+    
+    return track_completo
+
+def construir_pistas_midi(pistas, instrumentos_disponibles, instrumentos_procesados, ticks_per_beat, log=None,
+                          dificultades=None):
+    """
+    Reemplaza las pistas de los instrumentos procesados (Expert original + dificultades
+    REGENERADAS + eventos especiales) y mantiene el resto de pistas intactas.
+    dificultades: si se indica, solo esas dificultades en las pistas nuevas (archivos de práctica)
+    Retorna la lista final de pistas.
+    """
+    pistas_finales = []
+    
+    for pista_original in pistas:
+        # Nombre de esta pista (sin decodificar notas)
+        nombre = leer_nombre_pista(pista_original[8:])
         
-        # Calcular separaciones entre cada par consecutivo
-        mejor_par = None
-        menor_separacion = float('inf')
+        # Verificar si esta pista corresponde a algún instrumento procesado
+        pista_reemplazada = False
         
-        for i in range(len(notas_ordenadas) - 1):
-            fret_a = notas_ordenadas[i][0]
-            fret_b = notas_ordenadas[i + 1][0]
-            separacion = fret_b - fret_a
+        for inst_code, nuevas_diffs in instrumentos_procesados.items():
+            nombre_pista_buscado = NOMBRES_PISTA_MIDI.get(inst_code, "PART GUITAR")
             
-            # Encontrar el par con menor separación (más cercano)
-            if separacion < menor_separacion:
-                menor_separacion = separacion
-                mejor_par = [notas_ordenadas[i], notas_ordenadas[i + 1]]
+            if nombre and nombre_pista_buscado in nombre.upper():
+                # Solo usar las dificultades REGENERADAS (no combinar con existentes)
+                todas_dificultades = {}
+                
+                # Siempre incluir Expert original
+                if 'Expert' in instrumentos_disponibles[inst_code]:
+                    todas_dificultades['Expert'] = instrumentos_disponibles[inst_code]['Expert']
+                
+                # Agregar dificultades REGENERADAS (Hard, Medium, Easy)
+                for diff, notas in nuevas_diffs.items():
+                    todas_dificultades[diff] = notas
+                
+                if dificultades is not None:
+                    todas_dificultades = {diff: notas for diff, notas in todas_dificultades.items()
+                                          if diff in dificultades}
+                
+                # Obtener eventos especiales
+                eventos_especiales = instrumentos_disponibles[inst_code].get('notas_especiales', [])
+                
+                # Crear nueva pista con TODAS las dificultades + eventos especiales
+                pista_nueva = crear_pista_multidificultad(nombre_pista_buscado, todas_dificultades, eventos_especiales)
+                pistas_finales.append(pista_nueva)
+                pista_reemplazada = True
+                
+                if log:
+                    inst_nombre = INSTRUMENTOS.get(inst_code, inst_code)
+                    log(f"   ✅ Pista '{nombre}' ({inst_nombre}) actualizada")
+                break
         
-        return mejor_par if mejor_par else notas_ordenadas[:2]
+        # Si esta pista NO fue procesada, mantenerla original
+        if not pista_reemplazada:
+            pistas_finales.append(pista_original)
     
-    else:
-        # Para otros casos, mantener las primeras N notas
-        return notas_ordenadas[:max_notas]
+    return pistas_finales
 
-def crear_seccion_chart(nombre, notas):
-    """Crea sección de chart"""
-    if not notas:
-        return ""
+def chart_a_texto(contenido_chart, instrumentos_procesados, instrumentos_disponibles=None):
+    """
+    Contenido .chart original (con su Expert) + secciones regeneradas de TODOS los
+    instrumentos procesados. Las secciones Hard/Medium/Easy que ya existían de esos
+    instrumentos se eliminan para no duplicarlas.
+    instrumentos_disponibles: instrumentos parseados, para copiar su Star Power a las secciones nuevas
+    """
+    regeneradas = {diff for nuevas_diffs in instrumentos_procesados.values() for diff in nuevas_diffs}
+    partes = [''.join(lineas_sin_notas_chart(contenido_chart, list(instrumentos_procesados),
+                                             [diff for diff in DIFICULTADES if diff in regeneradas]))]
+    for inst_code, nuevas_diffs in instrumentos_procesados.items():
+        star_power = frases_star_power((instrumentos_disponibles or {}).get(inst_code, {}))
+        for diff, notas in nuevas_diffs.items():
+            partes.append(crear_seccion_chart(f"{diff}{inst_code}", notas, star_power))
+    return ''.join(partes)
+
+# --- SALIDAS (MIDI / CHART / PRÁCTICA) ---
+# Una "canción" es el resultado de parsear una vez:
+#   {'tipo': 'midi'|'chart', 'ticks_per_beat', 'instrumentos',
+#    'midi_header', 'midi_pistas'  (MIDI)  |  'contenido_chart'  (.chart)}
+# A partir de ella y de las dificultades reducidas se codifica cualquier salida.
+
+FORMATOS_SALIDA = {'midi': '.mid', 'chart': '.chart'}
+
+def leer_sync_midi(pistas):
+    """
+    Extrae tempos y compases de las pistas MIDI.
+    Retorna: (tempos [(tick, microsegundos_por_beat)], compases [(tick, numerador, potencia_denominador)])
+    """
+    tempos = []
+    compases = []
     
-    texto = f'\n[{nombre}]\n{{\n'
-    for tick, fret, duration in notas:
-        texto += f'  {tick} = N {fret} {duration}\n'
+    for pista in pistas:
+        for tick, status, meta_type, contenido in eventos_pista_midi(pista[8:]):
+            if status != 0xFF:
+                continue
+            # Set Tempo (0x51) y Time Signature (0x58)
+            if meta_type == 0x51 and len(contenido) == 3:
+                tempos.append((tick, int.from_bytes(contenido, 'big')))
+            elif meta_type == 0x58 and len(contenido) >= 2:
+                compases.append((tick, contenido[0], contenido[1]))
+    
+    tempos.sort()
+    compases.sort()
+    return tempos, compases
+
+def leer_sync_chart(lineas):
+    """
+    Extrae resolución, tempos y compases de un .chart ([Song] y [SyncTrack]).
+    Retorna: (resolucion, tempos [(tick, microsegundos_por_beat)], compases [(tick, numerador, potencia_denominador)])
+    """
+    resolucion = 192
+    tempos = []
+    compases = []
+    seccion = None
+    
+    for linea in lineas:
+        linea = linea.strip()
+        if linea.startswith('[') and linea.endswith(']'):
+            seccion = linea[1:-1]
+            continue
+        
+        partes = linea.split()
+        if seccion == 'Song' and len(partes) >= 3 and partes[0] == 'Resolution':
+            try:
+                resolucion = int(partes[2])
+            except ValueError:
+                pass
+        elif seccion == 'SyncTrack' and len(partes) >= 4 and partes[1] == '=':
+            try:
+                tick = int(partes[0])
+                if partes[2] == 'B':
+                    # B = BPM × 1000
+                    tempos.append((tick, round(60000000000 / int(partes[3]))))
+                elif partes[2] == 'TS':
+                    potencia = int(partes[4]) if len(partes) >= 5 else 2
+                    compases.append((tick, int(partes[3]), potencia))
+            except (ValueError, ZeroDivisionError):
+                continue
+    
+    return resolucion, tempos, compases
+
+def crear_pista_tempo(tempos, compases):
+    """Crea la pista de tempo MIDI (Set Tempo + Time Signature)"""
+    eventos_abs = []
+    for tick, numerador, potencia in compases:
+        eventos_abs.append((tick, b'\xFF\x58\x04' + bytes([numerador, potencia, 24, 8])))
+    for tick, microsegundos in tempos:
+        eventos_abs.append((tick, b'\xFF\x51\x03' + microsegundos.to_bytes(3, 'big')))
+    eventos_abs.sort(key=lambda x: x[0])
+    
+    eventos = bytearray()
+    ultimo_tick = 0
+    for tick, evento in eventos_abs:
+        eventos.extend(escribir_variable_length(tick - ultimo_tick))
+        eventos.extend(evento)
+        ultimo_tick = tick
+    
+    # End of Track
+    eventos.extend(b'\x00\xFF\x2F\x00')
+    return b"MTrk" + struct.pack(">I", len(eventos)) + bytes(eventos)
+
+def crear_cabecera_chart(resolucion, tempos, compases):
+    """Secciones [Song] y [SyncTrack] de un .chart"""
+    texto = f'[Song]\n{{\n  Resolution = {resolucion}\n}}\n[SyncTrack]\n{{\n'
+    eventos = [(tick, 0, f'TS {numerador}' + (f' {potencia}' if potencia != 2 else ''))
+               for tick, numerador, potencia in compases]
+    eventos += [(tick, 1, f'B {round(60000000000 / microsegundos)}') for tick, microsegundos in tempos]
+    for tick, _, evento in sorted(eventos):
+        texto += f'  {tick} = {evento}\n'
     texto += '}\n'
     return texto
 
+def lineas_sin_notas_chart(lineas, instrumentos=None, dificultades=None):
+    """
+    Líneas del .chart SIN las secciones de notas de instrumentos (para reescribirlas).
+    instrumentos / dificultades: limitar a esas secciones (por defecto todas)
+    """
+    secciones_notas = {f"[{diff}{inst_code}]" for diff in (dificultades or DIFICULTADES)
+                       for inst_code in (instrumentos or INSTRUMENTOS)}
+    resultado = []
+    omitiendo = False
+    
+    for linea in lineas:
+        limpia = linea.strip()
+        if limpia in secciones_notas:
+            omitiendo = True
+            # La línea en blanco que separa la sección también sobra (crear_seccion_chart la vuelve a poner)
+            if resultado and not resultado[-1].strip():
+                resultado.pop()
+            continue
+        if omitiendo:
+            if limpia == '}':
+                omitiendo = False
+            continue
+        resultado.append(linea)
+    
+    return resultado
+
+def secciones_dificultades_chart(cancion, instrumentos_procesados, dificultades):
+    """Secciones de notas (Expert original + reducidas) para las dificultades pedidas"""
+    texto = ''
+    for inst_code, nuevas_diffs in instrumentos_procesados.items():
+        data = cancion['instrumentos'][inst_code]
+        todas = dict(nuevas_diffs, Expert=data['Expert'])
+        star_power = frases_star_power(data)
+        
+        for diff in reversed(DIFICULTADES):
+            if diff in dificultades and todas.get(diff):
+                texto += crear_seccion_chart(f"{diff}{inst_code}", todas[diff], star_power)
+    return texto
+
+def codificar_midi(cancion, instrumentos_procesados, dificultades=None):
+    """MIDI completo (o solo 'dificultades') a partir de una canción parseada"""
+    if cancion['tipo'] == 'midi':
+        pistas = construir_pistas_midi(cancion['midi_pistas'], cancion['instrumentos'],
+                                       instrumentos_procesados, cancion['ticks_per_beat'],
+                                       dificultades=dificultades)
+        return midi_a_bytes(cancion['midi_header'], pistas, [], len(pistas))
+    
+    # .chart → MIDI: pista de tempo + una pista por instrumento
+    resolucion, tempos, compases = leer_sync_chart(cancion['contenido_chart'])
+    pistas = [crear_pista_tempo(tempos, compases)]
+    for inst_code, nuevas_diffs in instrumentos_procesados.items():
+        data = cancion['instrumentos'][inst_code]
+        todas = dict(nuevas_diffs, Expert=data['Expert'])
+        # MIDI solo tiene 5 frets por dificultad (sin forced/tap/open de .chart)
+        todas = {diff: [n for n in notas if 0 <= n[1] <= 4] for diff, notas in todas.items()
+                 if dificultades is None or diff in dificultades}
+        pistas.append(crear_pista_multidificultad(NOMBRES_PISTA_MIDI.get(inst_code, "PART GUITAR"), todas,
+                                                  data.get('notas_especiales', [])))
+    
+    header = b"MThd" + struct.pack(">IHHH", 6, 1, len(pistas), resolucion)
+    return midi_a_bytes(header, pistas, [], len(pistas))
+
+def codificar_chart(cancion, instrumentos_procesados, dificultades=None):
+    """.chart completo (o solo 'dificultades') a partir de una canción parseada"""
+    if cancion['tipo'] == 'chart':
+        if dificultades is None:
+            return chart_a_texto(cancion['contenido_chart'], instrumentos_procesados, cancion['instrumentos'])
+        base = ''.join(lineas_sin_notas_chart(cancion['contenido_chart']))
+        return base + secciones_dificultades_chart(cancion, instrumentos_procesados, dificultades)
+    
+    # MIDI → .chart: [Song] + [SyncTrack] + notas
+    tempos, compases = leer_sync_midi(cancion['midi_pistas'])
+    texto = crear_cabecera_chart(cancion['ticks_per_beat'], tempos, compases)
+    return texto + secciones_dificultades_chart(cancion, instrumentos_procesados,
+                                                dificultades or DIFICULTADES)
+
+def codificar_salida(cancion, instrumentos_procesados, formato, dificultades=None):
+    """Codifica una salida ('midi' o 'chart'). Retorna bytes listos para escribir"""
+    if formato == 'midi':
+        return codificar_midi(cancion, instrumentos_procesados, dificultades)
+    if formato == 'chart':
+        return codificar_chart(cancion, instrumentos_procesados, dificultades).encode('utf-8')
+    raise ValueError(f"Formato de salida desconocido: {formato}")
+
+def generar_salidas(cancion, instrumentos_procesados, objetivos, workers=None):
+    """
+    Codifica varias salidas a partir del MISMO resultado parseado y reducido.
+    objetivos: [(formato, dificultades o None), ...]
+    workers: procesos para codificar en paralelo (None = en serie)
+    Retorna la lista de bytes en el mismo orden que objetivos.
+    """
+    return ejecutar_en_pool(codificar_salida,
+                            [(cancion, instrumentos_procesados, formato, dificultades)
+                             for formato, dificultades in objetivos],
+                            workers)
+
+def leer_cancion(ruta, workers=None):
+    """Parsea un .mid o .chart (o el de un .sng/.zip) UNA vez. Retorna la canción (ver arriba)"""
+    if contenedores.extension_efectiva(ruta) == '.mid':
+        header, pistas, instrumentos, ticks_per_beat = leer_midi_completo(ruta, workers)
+        if header is None:
+            raise ValueError("No es un archivo MIDI válido")
+        return {'tipo': 'midi', 'ticks_per_beat': ticks_per_beat, 'instrumentos': instrumentos,
+                'midi_header': header, 'midi_pistas': pistas}
+    
+    lineas = leer_lineas_chart(ruta)
+    return {'tipo': 'chart', 'ticks_per_beat': 192, 'instrumentos': detectar_instrumentos_chart(lineas),
+            'contenido_chart': lineas}
+
+# --- API EN MEMORIA ---
+def reduce_midi_bytes(data, workers=None):
+    """
+    Reduce un MIDI completo en memoria: bytes de entrada → bytes de salida.
+    workers: procesos para parsear y reducir en paralelo (salida idéntica a la serie)
+    Lanza ValueError si no es un MIDI válido o no tiene instrumentos con Expert.
+    """
+    header, pistas, instrumentos, ticks_per_beat = leer_midi_bytes(data, workers)
+    if header is None:
+        raise ValueError("No es un archivo MIDI válido")
+    
+    instrumentos_procesados = reducir_instrumentos(instrumentos, ticks_per_beat, workers)
+    if not instrumentos_procesados:
+        raise ValueError("No hay instrumentos con Expert para procesar")
+    
+    pistas_finales = construir_pistas_midi(pistas, instrumentos, instrumentos_procesados, ticks_per_beat)
+    return midi_a_bytes(header, pistas_finales, [], len(pistas_finales))
+
+def reduce_chart_text(text):
+    """
+    Reduce un .chart en memoria: texto de entrada → texto de salida.
+    Lanza ValueError si no tiene instrumentos con Expert.
+    """
+    lineas = text.splitlines(keepends=True)
+    instrumentos = detectar_instrumentos_chart(lineas)
+    
+    instrumentos_procesados = reducir_instrumentos(instrumentos, 192)
+    if not instrumentos_procesados:
+        raise ValueError("No hay instrumentos con Expert para procesar")
+    
+    return chart_a_texto(lineas, instrumentos_procesados, instrumentos)
+
 # --- INTERFAZ ---
+AJUSTE_DEBOUNCE_MS = 40     # Espera tras mover un slider antes de recalcular
+VENTANA_DENSIDAD_BEATS = 32  # Beats visibles en la franja de densidad
+
 class GHReducerApp:
     def __init__(self, master):
         self.master = master
         master.title("GH Chart Reducer v0.11")
-        master.geometry("700x720")
+        master.geometry("700x960")
         
         self.ruta_archivo = ""
         self.tipo_archivo = None
@@ -548,6 +1227,16 @@ class GHReducerApp:
         self.instrumentos_disponibles = {}
         self.ticks_per_beat = 192
         
+        # Ajuste en vivo: parámetros por dificultad + cachés para recalcular solo lo afectado
+        self.parametros = {
+            diff: {'spacing_multiplier': SPACING_MULTIPLIER[diff], 'max_chord_size': MAX_CHORD_SIZE[diff]}
+            for diff in ['Hard', 'Medium', 'Easy']
+        }
+        self.preparados = {}         # {inst_code: preparar_reduccion(Expert)}
+        self.resultados_vivos = {}   # {(inst_code, diff): ticks únicos ordenados}
+        self.diffs_pendientes = set()
+        self.ajuste_pendiente = None
+        
         # UI
         frame_archivo = tk.Frame(master)
         frame_archivo.pack(pady=10, padx=10, fill=tk.X)
@@ -580,6 +1269,43 @@ class GHReducerApp:
         self.list_diffs = tk.Listbox(frame_inst, height=6)
         self.list_diffs.pack(fill=tk.BOTH, expand=True, pady=5)
         
+        frame_ajuste = tk.LabelFrame(master, text="🎛️ Ajuste en vivo", padx=10, pady=5)
+        frame_ajuste.pack(pady=5, padx=10, fill=tk.X)
+        
+        self.vars_espaciado = {}
+        self.vars_acorde = {}
+        self.labels_resultado = {}
+        for fila, diff in enumerate(['Hard', 'Medium', 'Easy']):
+            tk.Label(frame_ajuste, text=diff, width=7, anchor=tk.W).grid(row=fila, column=0)
+            
+            self.vars_espaciado[diff] = tk.DoubleVar(value=SPACING_MULTIPLIER[diff])
+            tk.Scale(frame_ajuste, variable=self.vars_espaciado[diff], from_=0.5, to=5.0, resolution=0.01,
+                     orient=tk.HORIZONTAL, length=220, label="Espaciado ×",
+                     command=lambda _, d=diff: self.programar_recalculo(d)).grid(row=fila, column=1)
+            
+            self.vars_acorde[diff] = tk.IntVar(value=MAX_CHORD_SIZE[diff])
+            tk.Scale(frame_ajuste, variable=self.vars_acorde[diff], from_=1, to=3,
+                     orient=tk.HORIZONTAL, length=100, label="Acorde máx",
+                     command=lambda _, d=diff: self.programar_recalculo(d)).grid(row=fila, column=2)
+            
+            self.labels_resultado[diff] = tk.Label(frame_ajuste, text="—", width=22, anchor=tk.W)
+            self.labels_resultado[diff].grid(row=fila, column=3, padx=5)
+        
+        self.canvas_densidad = tk.Canvas(frame_ajuste, height=70, bg="#222222", highlightthickness=0)
+        self.canvas_densidad.grid(row=3, column=0, columnspan=4, sticky="ew", pady=(5, 0))
+        
+        self.var_ventana = tk.DoubleVar(value=0.0)
+        tk.Scale(frame_ajuste, variable=self.var_ventana, from_=0.0, to=100.0, resolution=0.1,
+                 orient=tk.HORIZONTAL, showvalue=False, label="Posición (%)",
+                 command=lambda _: self.dibujar_densidad()).grid(row=4, column=0, columnspan=4, sticky="ew")
+        
+        self.label_tiempo = tk.Label(frame_ajuste, text="", font=("Arial", 8), fg="gray")
+        self.label_tiempo.grid(row=5, column=0, columnspan=4, sticky=tk.E)
+        
+        self.var_paralelo = tk.BooleanVar(value=False)
+        tk.Checkbutton(master, text="⚡ Procesamiento paralelo (archivos grandes multipista)",
+                       variable=self.var_paralelo).pack()
+        
         self.btn_generar = tk.Button(master, text="⚙️ Generar Dificultades (TODOS los instrumentos)", 
                                      command=self.generar_dificultades, state=tk.DISABLED,
                                      font=("Arial", 11, "bold"), bg="#4CAF50", fg="white", pady=8)
@@ -594,6 +1320,95 @@ class GHReducerApp:
         scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.text_log.pack(fill=tk.BOTH, expand=True)
     
+    def instrumento_seleccionado(self):
+        idx = self.combo_inst.current()
+        if idx < 0 or not self.instrumentos_disponibles:
+            return None
+        return list(self.instrumentos_disponibles.keys())[idx]
+    
+    def programar_recalculo(self, diff):
+        """Agrupa cambios de sliders y recalcula tras AJUSTE_DEBOUNCE_MS sin movimiento"""
+        self.diffs_pendientes.add(diff)
+        if self.ajuste_pendiente is not None:
+            self.master.after_cancel(self.ajuste_pendiente)
+        self.ajuste_pendiente = self.master.after(AJUSTE_DEBOUNCE_MS, self.recalcular_en_vivo)
+    
+    def recalcular_en_vivo(self):
+        """Recalcula SOLO las dificultades cambiadas del instrumento seleccionado"""
+        self.ajuste_pendiente = None
+        diffs = self.diffs_pendientes
+        self.diffs_pendientes = set()
+        
+        for diff in diffs:
+            self.parametros[diff]['spacing_multiplier'] = self.vars_espaciado[diff].get()
+            self.parametros[diff]['max_chord_size'] = self.vars_acorde[diff].get()
+        
+        inst_code = self.instrumento_seleccionado()
+        if inst_code is None or 'Expert' not in self.instrumentos_disponibles[inst_code]:
+            return
+        
+        inicio = time.perf_counter()
+        data = self.instrumentos_disponibles[inst_code]
+        
+        # Agrupación por tick + espaciado mediano: una vez por instrumento
+        if inst_code not in self.preparados:
+            self.preparados[inst_code] = preparar_reduccion(data['Expert'])
+        preparado = self.preparados[inst_code]
+        ticks_expert = len(preparado['ticks_ordenados'])
+        star_power_ticks = ticks_star_power(data)
+        
+        for diff in diffs:
+            notas = reducir_preparado(preparado, diff, star_power_ticks, self.parametros[diff])
+            ticks = sorted(set(n[0] for n in notas))
+            self.resultados_vivos[(inst_code, diff)] = ticks
+            porcentaje = int((len(ticks) / ticks_expert) * 100) if ticks_expert > 0 else 0
+            self.labels_resultado[diff].config(text=f"{len(ticks)} notas ({porcentaje}%)")
+        
+        self.dibujar_densidad()
+        self.label_tiempo.config(text=f"⏱ {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    
+    def dibujar_densidad(self):
+        """Franja de densidad: solo las notas de la ventana visible (localizadas con bisect)"""
+        canvas = self.canvas_densidad
+        canvas.delete("all")
+        
+        inst_code = self.instrumento_seleccionado()
+        if inst_code not in self.preparados:
+            return
+        
+        filas = [('Expert', self.preparados[inst_code]['ticks_ordenados'])]
+        for diff in ['Hard', 'Medium', 'Easy']:
+            filas.append((diff, self.resultados_vivos.get((inst_code, diff), [])))
+        
+        ticks_expert = filas[0][1]
+        if not ticks_expert:
+            return
+        
+        margen = 50
+        ancho = canvas.winfo_width()
+        if ancho <= margen:
+            # Aún sin dibujar en pantalla: usar el ancho de la ventana
+            ancho = self.master.winfo_width() - 40
+        alto_fila = int(canvas['height']) / len(filas)
+        ventana = VENTANA_DENSIDAD_BEATS * self.ticks_per_beat
+        tick_inicio = int(ticks_expert[-1] * self.var_ventana.get() / 100)
+        tick_fin = tick_inicio + ventana
+        
+        for fila, (diff, ticks) in enumerate(filas):
+            y0 = fila * alto_fila + 2
+            y1 = (fila + 1) * alto_fila - 2
+            canvas.create_text(4, (y0 + y1) / 2, text=diff, anchor=tk.W, fill="white", font=("Arial", 7))
+            
+            desde = bisect_left(ticks, tick_inicio)
+            hasta = bisect_left(ticks, tick_fin)
+            for tick in ticks[desde:hasta]:
+                x = margen + (tick - tick_inicio) * (ancho - margen) / ventana
+                canvas.create_line(x, y0, x, y1, fill="#4CAF50")
+    
+    def workers_paralelo(self):
+        """Procesos para parsear/reducir en paralelo (None = en serie)"""
+        return os.cpu_count() if self.var_paralelo.get() else None
+    
     def log(self, msg):
         self.text_log.insert(tk.END, msg + "\n")
         self.text_log.see(tk.END)
@@ -601,9 +1416,11 @@ class GHReducerApp:
     def cargar_archivo(self):
         self.ruta_archivo = filedialog.askopenfilename(
             filetypes=[
-                ("Archivos compatibles", "*.chart *.mid"),
+                ("Archivos compatibles", "*.chart *.mid *.sng *.zip"),
                 ("Chart Files", "*.chart"),
-                ("MIDI Files", "*.mid")
+                ("MIDI Files", "*.mid"),
+                ("Clone Hero SNG", "*.sng"),
+                ("ZIP", "*.zip")
             ]
         )
         
@@ -613,16 +1430,27 @@ class GHReducerApp:
         self.text_log.delete(1.0, tk.END)
         self.list_diffs.delete(0, tk.END)
         self.instrumentos_disponibles = {}
+        self.preparados = {}
+        self.resultados_vivos = {}
         
         self.label_archivo.config(text=f"📁 {os.path.basename(self.ruta_archivo)}")
-        ext = os.path.splitext(self.ruta_archivo)[1].lower()
+        try:
+            ext = contenedores.extension_efectiva(self.ruta_archivo)
+        except Exception as e:
+            self.log(f"❌ Error: {e}")
+            messagebox.showerror("Error", str(e))
+            return
+        
+        if contenedores.es_contenedor(self.ruta_archivo):
+            self.log(f"📦 Contenedor {contenedores.tipo_contenedor(self.ruta_archivo)}: "
+                     f"{contenedores.miembro_notas(self.ruta_archivo)}")
         
         if ext == '.mid':
             self.tipo_archivo = 'midi'
             self.log("🎵 Archivo MIDI detectado")
-            self.log("Leyendo archivo completo (preservando TODO)...\n")
+            self.log("Indexando pistas (las notas se leen al seleccionar cada instrumento)...\n")
             
-            self.midi_header, self.midi_pistas, self.instrumentos_disponibles, self.ticks_per_beat = leer_midi_completo(self.ruta_archivo)
+            self.midi_header, self.midi_pistas, self.instrumentos_disponibles, self.ticks_per_beat = leer_midi_indexado(self.ruta_archivo)
             
             if not self.instrumentos_disponibles:
                 self.log("❌ No se detectaron instrumentos")
@@ -634,34 +1462,19 @@ class GHReducerApp:
             self.log("   (Incluye VOCALS, Star Power ⭐, tempos, eventos, etc.)\n")
             
             self.log("📊 Instrumentos detectados:")
-            for inst_code, data in self.instrumentos_disponibles.items():
+            for inst_code in self.instrumentos_disponibles:
                 nombre = INSTRUMENTOS.get(inst_code, inst_code)
-                self.log(f"\n🎸 {nombre}:")
-                
-                # Verificar si tiene Expert
-                if 'Expert' not in data:
-                    self.log(f"   ⚠️ SIN EXPERT - No se puede regenerar (se necesita Expert)")
-                    continue
-                
-                # Mostrar eventos especiales
-                if 'notas_especiales' in data and data['notas_especiales']:
-                    self.log(f"   ⭐ {len(data['notas_especiales'])} eventos especiales (Star Power, etc.)")
-                
-                for diff in DIFICULTADES:
-                    if diff in data:
-                        notas = data[diff]
-                        ticks_unicos = len(set(n[0] for n in notas))
-                        self.log(f"   ✅ {diff}: {ticks_unicos} notas detectadas")
-                    else:
-                        self.log(f"   ➖ {diff}: No existe (se generará)")
+                self.log(f"   🎸 {nombre} ({NOMBRES_PISTA_MIDI[inst_code]})")
         
         elif ext == '.chart':
             self.tipo_archivo = 'chart'
             self.log("📄 Archivo .chart detectado\n")
             
             try:
-                with open(self.ruta_archivo, 'r', encoding='utf-8') as f:
-                    self.contenido_chart = f.readlines()
+                self.contenido_chart = leer_lineas_chart(self.ruta_archivo)
+                # Resolution de [Song]: escala de la ventana de densidad
+                self.ticks_per_beat = leer_sync_chart(self.contenido_chart)[0]
+                self.log(f"✅ Resolution: {self.ticks_per_beat}")
                 
                 self.instrumentos_disponibles = detectar_instrumentos_chart(self.contenido_chart)
                 
@@ -688,6 +1501,10 @@ class GHReducerApp:
             lista_inst = []
             for inst_code in self.instrumentos_disponibles:
                 nombre = INSTRUMENTOS.get(inst_code, inst_code)
+                if self.tipo_archivo == 'midi':
+                    # Sin decodificar todavía: solo el nombre de la pista
+                    lista_inst.append(f"{nombre} ({NOMBRES_PISTA_MIDI[inst_code]})")
+                    continue
                 # Contar solo dificultades, no 'notas_especiales'
                 num_diffs = len([k for k in self.instrumentos_disponibles[inst_code].keys() if k in DIFICULTADES])
                 lista_inst.append(f"{nombre} ({num_diffs} dificultades)")
@@ -696,7 +1513,8 @@ class GHReducerApp:
             self.combo_inst.current(0)
             self.combo_inst.config(state="readonly")
             self.combo_inst.bind("<<ComboboxSelected>>", self.actualizar_diffs)
-            self.actualizar_diffs()
+            # Decodificar el primer instrumento cuando Tk quede libre: la ventana responde antes
+            self.master.after_idle(self.actualizar_diffs)
             self.btn_generar.config(state=tk.NORMAL)
     
     def actualizar_diffs(self, event=None):
@@ -704,7 +1522,12 @@ class GHReducerApp:
         
         idx = self.combo_inst.current()
         inst_code = list(self.instrumentos_disponibles.keys())[idx]
+        
+        # MIDI: primera vez que se selecciona → decodificar y mostrar detalle
+        primera_vez = self.tipo_archivo == 'midi' and not self.instrumentos_disponibles.decodificado(inst_code)
         data = self.instrumentos_disponibles[inst_code]
+        if primera_vez:
+            self.log_instrumento_midi(inst_code, data)
         
         for diff in DIFICULTADES:
             if diff in data:
@@ -712,18 +1535,47 @@ class GHReducerApp:
                 self.list_diffs.insert(tk.END, f"✅ {diff}: {ticks_unicos} notas")
             else:
                 self.list_diffs.insert(tk.END, f"❌ {diff}: No existe")
+        
+        for diff in ['Hard', 'Medium', 'Easy']:
+            self.programar_recalculo(diff)
+    
+    def log_instrumento_midi(self, inst_code, data):
+        nombre = INSTRUMENTOS.get(inst_code, inst_code)
+        self.log(f"\n🎸 {nombre}:")
+        
+        # Verificar si tiene Expert
+        if 'Expert' not in data:
+            self.log(f"   ⚠️ SIN EXPERT - No se puede regenerar (se necesita Expert)")
+            return
+        
+        # Mostrar eventos especiales
+        if 'notas_especiales' in data and data['notas_especiales']:
+            self.log(f"   ⭐ {len(data['notas_especiales'])} eventos especiales (Star Power, etc.)")
+        
+        for diff in DIFICULTADES:
+            if diff in data:
+                notas = data[diff]
+                ticks_unicos = len(set(n[0] for n in notas))
+                self.log(f"   ✅ {diff}: {ticks_unicos} notas detectadas")
+            else:
+                self.log(f"   ➖ {diff}: No existe (se generará)")
     
     def generar_dificultades(self):
         """Genera dificultades para TODOS los instrumentos (REGENERA si ya existen)"""
         if not self.instrumentos_disponibles:
             return
         
+        # MIDI: decodificar los instrumentos que aún no se han seleccionado
+        if self.tipo_archivo == 'midi':
+            self.instrumentos_disponibles.decodificar_todos(self.workers_paralelo())
+        
         self.log(f"\n\n{'='*60}")
         self.log("⚙️ GENERANDO DIFICULTADES PARA TODOS LOS INSTRUMENTOS")
         self.log(f"{'='*60}\n")
         
-        # Procesar CADA instrumento
-        instrumentos_procesados = {}
+        # Procesar CADA instrumento (instrumento×dificultad en paralelo si está activado)
+        instrumentos_procesados = reducir_instrumentos(self.instrumentos_disponibles, self.ticks_per_beat,
+                                                       self.workers_paralelo(), self.parametros)
         
         for inst_code, data in self.instrumentos_disponibles.items():
             inst_nombre = INSTRUMENTOS.get(inst_code, inst_code)
@@ -736,9 +1588,7 @@ class GHReducerApp:
             ticks_expert = len(set(n[0] for n in notas_expert))
             
             # Extraer ticks de Star Power (nota MIDI 116)
-            star_power_ticks = []
-            if 'notas_especiales' in data:
-                star_power_ticks = [tick for tick, nota in data['notas_especiales'] if nota == 116]
+            star_power_ticks = ticks_star_power(data)
             
             self.log(f"\n🎸 {inst_nombre}:")
             self.log(f"   Expert: {ticks_expert} notas")
@@ -746,41 +1596,59 @@ class GHReducerApp:
                 self.log(f"   ⭐ Star Power: {len(star_power_ticks)} secciones")
             
             # CRÍTICO: SIEMPRE generar todas las dificultades (regenerar si existen)
-            nuevas_diffs = {}
-            for diff in ['Hard', 'Medium', 'Easy']:
-                notas = aplicar_reduccion_adaptativa(notas_expert, diff, self.ticks_per_beat, star_power_ticks)
-                nuevas_diffs[diff] = notas
+            nuevas_diffs = instrumentos_procesados[inst_code]
+            for diff, notas in nuevas_diffs.items():
                 ticks_generados = len(set(n[0] for n in notas))
                 porcentaje = int((ticks_generados / ticks_expert) * 100) if ticks_expert > 0 else 0
                 
                 estado = "regenerada" if diff in data else "generada"
                 self.log(f"   ✅ {diff}: {ticks_generados} notas ({porcentaje}% de Expert) - {estado}")
-            
-            instrumentos_procesados[inst_code] = nuevas_diffs
         
         if not instrumentos_procesados:
             messagebox.showinfo("Info", "No hay instrumentos con Expert para procesar")
             return
         
-        # Guardar según tipo
+        # Guardar en el formato original por defecto (o convertir al otro)
         if self.tipo_archivo == 'midi':
             ext_salida = ".mid"
-            tipo_desc = "MIDI Files"
+            tipos_salida = [("MIDI Files", "*.mid"), ("Chart Files", "*.chart")]
         else:
             ext_salida = ".chart"
-            tipo_desc = "Chart Files"
+            tipos_salida = [("Chart Files", "*.chart"), ("MIDI Files", "*.mid")]
+        
+        # Contenedor de entrada → por defecto un contenedor nuevo del mismo tipo
+        ext_inicial = ext_salida
+        if contenedores.es_contenedor(self.ruta_archivo):
+            ext_inicial = contenedores.tipo_contenedor(self.ruta_archivo)
+            tipos_salida.insert(0, (f"Contenedor {ext_inicial}", f"*{ext_inicial}"))
         
+        nombre_base = os.path.splitext(os.path.basename(contenedores.separar_ruta(self.ruta_archivo)[0]))[0]
         ruta_salida = filedialog.asksaveasfilename(
-            defaultextension=ext_salida,
-            filetypes=[(tipo_desc, f"*{ext_salida}")],
-            initialfile=f"REDUCED_{os.path.splitext(os.path.basename(self.ruta_archivo))[0]}{ext_salida}"
+            defaultextension=ext_inicial,
+            filetypes=tipos_salida,
+            initialfile=f"REDUCED_{nombre_base}{ext_inicial}"
         )
         
         if not ruta_salida:
             return
         
         try:
-            if self.tipo_archivo == 'midi':
+            ext_elegida = os.path.splitext(ruta_salida)[1].lower()
+            if ext_elegida not in ('.mid', '.chart') and not contenedores.es_contenedor(ruta_salida):
+                ext_elegida = ext_salida
+            
+            if contenedores.es_contenedor(ruta_salida):
+                # Mismo formato de notas dentro del contenedor; audio/arte se copian tal cual
+                if self.tipo_archivo == 'midi':
+                    self.guardar_como_midi_multi(ruta_salida, instrumentos_procesados)
+                else:
+                    self.guardar_como_chart_multi(ruta_salida, instrumentos_procesados)
+            elif ext_elegida != ext_salida:
+                formato = 'midi' if ext_elegida == '.mid' else 'chart'
+                self.log(f"\n🔄 Convirtiendo a {ext_elegida}...")
+                with open(ruta_salida, 'wb') as f:
+                    f.write(codificar_salida(self.cancion_actual(), instrumentos_procesados, formato))
+            elif self.tipo_archivo == 'midi':
                 self.guardar_como_midi_multi(ruta_salida, instrumentos_procesados)
             else:
                 self.guardar_como_chart_multi(ruta_salida, instrumentos_procesados)
@@ -795,140 +1663,48 @@ class GHReducerApp:
             traceback.print_exc()
             messagebox.showerror("Error", f"No se pudo guardar:\n{e}")
     
+    def cancion_actual(self):
+        """Canción cargada en el formato de codificar_salida/generar_salidas"""
+        cancion = {'tipo': self.tipo_archivo, 'ticks_per_beat': self.ticks_per_beat,
+                   'instrumentos': self.instrumentos_disponibles}
+        if self.tipo_archivo == 'midi':
+            cancion['midi_header'] = self.midi_header
+            cancion['midi_pistas'] = self.midi_pistas
+        else:
+            cancion['contenido_chart'] = self.contenido_chart
+        return cancion
+    
     def guardar_como_midi_multi(self, ruta, instrumentos_procesados):
         """Guarda MIDI procesando TODOS los instrumentos"""
         self.log("\n📝 Generando archivo MIDI completo...")
         
-        # Índices de pistas que corresponden a instrumentos procesados
-        pistas_procesadas_indices = set()
-        pistas_finales = []
-        
-        # Primera pasada: identificar y procesar instrumentos
-        for idx, pista_original in enumerate(self.midi_pistas):
-            # Parsear nombre de esta pista
-            nombre, _ = parsear_pista_midi(pista_original[8:], self.ticks_per_beat)
-            
-            # Verificar si esta pista corresponde a algún instrumento procesado
-            pista_reemplazada = False
-            
-            for inst_code, nuevas_diffs in instrumentos_procesados.items():
-                nombre_pista_buscado = NOMBRES_PISTA_MIDI.get(inst_code, "PART GUITAR")
-                
-                if nombre and nombre_pista_buscado in nombre.upper():
-                    # Marcar esta pista como procesada
-                    pistas_procesadas_indices.add(idx)
-                    
-                    # Solo usar las dificultades REGENERADAS (no combinar con existentes)
-                    todas_dificultades = {}
-                    
-                    # Siempre incluir Expert original
-                    if 'Expert' in self.instrumentos_disponibles[inst_code]:
-                        todas_dificultades['Expert'] = self.instrumentos_disponibles[inst_code]['Expert']
-                    
-                    # Agregar dificultades REGENERADAS (Hard, Medium, Easy)
-                    for diff, notas in nuevas_diffs.items():
-                        todas_dificultades[diff] = notas
-                    
-                    # Obtener eventos especiales
-                    eventos_especiales = self.instrumentos_disponibles[inst_code].get('notas_especiales', [])
-                    
-                    # Crear nueva pista con TODAS las dificultades + eventos especiales
-                    pista_nueva = self.crear_pista_multidificultad(nombre_pista_buscado, todas_dificultades, eventos_especiales)
-                    pistas_finales.append(pista_nueva)
-                    pista_reemplazada = True
-                    
-                    inst_nombre = INSTRUMENTOS.get(inst_code, inst_code)
-                    self.log(f"   ✅ Pista '{nombre}' ({inst_nombre}) actualizada")
-                    break
-            
-            # Si esta pista NO fue procesada, mantenerla original
-            if not pista_reemplazada:
-                pistas_finales.append(pista_original)
+        pistas_finales = construir_pistas_midi(self.midi_pistas, self.instrumentos_disponibles,
+                                               instrumentos_procesados, self.ticks_per_beat, log=self.log)
         
         # Guardar MIDI completo
         num_total = len(pistas_finales)
-        guardar_midi(ruta, self.midi_header, pistas_finales, [], num_total)
+        guardar_midi(ruta, self.midi_header, pistas_finales, [], num_total, origen=self.ruta_archivo)
         
         self.log(f"\n✅ MIDI guardado con {num_total} pistas")
         self.log(f"   Instrumentos actualizados: {len(instrumentos_procesados)}")
     
     def crear_pista_multidificultad(self, nombre_pista, dificultades_dict, eventos_especiales=[]):
-        """
-        Crea una pista MIDI con múltiples dificultades + eventos especiales.
-        dificultades_dict: {'Expert': [(tick, fret, dur), ...], 'Hard': [...], ...}
-        eventos_especiales: [(tick, nota_midi), ...] - Star Power, etc.
-        """
-        eventos = bytearray()
-        
-        # Track Name
-        nombre_bytes = nombre_pista.encode('latin-1')
-        eventos.extend(b'\x00\xFF\x03')
-        eventos.extend(escribir_variable_length(len(nombre_bytes)))
-        eventos.extend(nombre_bytes)
-        
-        # Recopilar TODOS los eventos MIDI con tick absoluto
-        todos_eventos = []
-        
-        # 1. Agregar eventos de todas las dificultades
-        for diff, notas in dificultades_dict.items():
-            base_nota = RANGOS_NOTAS_MIDI.get(diff, 96)
-            for tick, fret, duration in notas:
-                nota_midi = base_nota + fret
-                dur = duration if duration > 0 else 10
-                
-                # Note On y Note Off como eventos separados
-                todos_eventos.append((tick, 'on', nota_midi))
-                todos_eventos.append((tick + dur, 'off', nota_midi))
-        
-        # 2. Agregar eventos especiales (Star Power, etc.)
-        for tick, nota_midi in eventos_especiales:
-            dur = 10  # Duración mínima para eventos especiales
-            todos_eventos.append((tick, 'on', nota_midi))
-            todos_eventos.append((tick + dur, 'off', nota_midi))
-        
-        # CRÍTICO: Ordenar TODOS los eventos por tick absoluto
-        # Si hay empate en tick, Note Off va antes que Note On
-        todos_eventos.sort(key=lambda x: (x[0], x[1] == 'on'))
-        
-        # Generar eventos MIDI con deltas correctos
-        ultimo_tick = 0
-        for tick_abs, tipo, nota_midi in todos_eventos:
-            delta = tick_abs - ultimo_tick
-            
-            if tipo == 'on':
-                # Note On
-                eventos.extend(escribir_variable_length(delta))
-                eventos.append(0x90)
-                eventos.append(nota_midi)
-                eventos.append(96)
-            else:
-                # Note Off
-                eventos.extend(escribir_variable_length(delta))
-                eventos.append(0x80)
-                eventos.append(nota_midi)
-                eventos.append(0)
-            
-            ultimo_tick = tick_abs
-        
-        # End of Track
-        eventos.extend(b'\x00\xFF\x2F\x00')
-        
-        # Construir pista completa
-        track_completo = b"MTrk" + struct.pack(">I", len(eventos)) + bytes(eventos)
-        
-        return track_completo
+        """Crea una pista MIDI con múltiples dificultades + eventos especiales"""
+        return crear_pista_multidificultad(nombre_pista, dificultades_dict, eventos_especiales)
     
     def guardar_como_chart_multi(self, ruta, instrumentos_procesados):
         """Guarda como .chart con TODOS los instrumentos procesados"""
+        texto = chart_a_texto(self.contenido_chart, instrumentos_procesados, self.instrumentos_disponibles)
+        if contenedores.es_contenedor(ruta):
+            contenedores.escribir_contenedor(ruta, self.ruta_archivo, texto.encode('utf-8'), '.chart')
+            return
         with open(ruta, 'w', encoding='utf-8') as f:
-            f.writelines(self.contenido_chart)
-            
-            for inst_code, nuevas_diffs in instrumentos_procesados.items():
-                for diff, notas in nuevas_diffs.items():
-                    seccion = f"{diff}{inst_code}"
-                    f.write(crear_seccion_chart(seccion, notas))
+            f.write(texto)
 
 if __name__ == "__main__":
+    if tk is None:
+        raise SystemExit("tkinter no está instalado: la interfaz no puede abrirse "
+                         "(servidor.py, lote.py y salidas.py funcionan sin él)")
     root = tk.Tk()
     app = GHReducerApp(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Genera varias salidas de una canción con UN solo parseo y UNA sola reducción.
+
+    python salidas.py notes.mid CARPETA [--formatos midi chart] [--practica Easy Medium] [--workers 4]
+
+Escribe en CARPETA:
+    REDUCED_<nombre>.mid / .chart       todas las dificultades
+    <DIFICULTAD>_<nombre>.mid / .chart  archivos de práctica con una sola dificultad
+"""
+import argparse
+import os
+
+import contenedores
+from reducer import (DIFICULTADES, FORMATOS_SALIDA, generar_salidas, leer_cancion,
+                     reducir_instrumentos)
+
+
+def objetivos_salida(nombre_base, formatos, practica):
+    """[(nombre_archivo, formato, dificultades o None), ...] en orden estable"""
+    objetivos = []
+    for formato in formatos:
+        objetivos.append((f"REDUCED_{nombre_base}{FORMATOS_SALIDA[formato]}", formato, None))
+    for diff in practica:
+        for formato in formatos:
+            objetivos.append((f"{diff.upper()}_{nombre_base}{FORMATOS_SALIDA[formato]}", formato, [diff]))
+    return objetivos
+
+
+def procesar_cancion(ruta, carpeta_salida, formatos=('midi', 'chart'), practica=(), workers=None, log=print):
+    """Parsea y reduce una vez, luego codifica y escribe todas las salidas. Retorna las rutas escritas"""
+    cancion = leer_cancion(ruta, workers)
+    instrumentos_procesados = reducir_instrumentos(cancion['instrumentos'], cancion['ticks_per_beat'], workers)
+    if not instrumentos_procesados:
+        raise ValueError("No hay instrumentos con Expert para procesar")
+
+    nombre_base = os.path.splitext(os.path.basename(contenedores.separar_ruta(ruta)[0]))[0]
+    objetivos = objetivos_salida(nombre_base, formatos, practica)
+    contenidos = generar_salidas(cancion, instrumentos_procesados,
+                                 [(formato, dificultades) for _, formato, dificultades in objetivos],
+                                 workers)
+
+    os.makedirs(carpeta_salida, exist_ok=True)
+    rutas = []
+    for (nombre, _, _), contenido in zip(objetivos, contenidos):
+        destino = os.path.join(carpeta_salida, nombre)
+        with open(destino, 'wb') as f:
+            f.write(contenido)
+        rutas.append(destino)
+        log(f"💾 {destino}")
+    return rutas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Varias salidas (.mid, .chart, práctica) con un solo parseo")
+    parser.add_argument('entrada')
+    parser.add_argument('carpeta_salida')
+    parser.add_argument('--formatos', nargs='+', choices=sorted(FORMATOS_SALIDA), default=['midi', 'chart'])
+    parser.add_argument('--practica', nargs='*', choices=DIFICULTADES, default=[],
+                        help="Dificultades para archivos de práctica (una dificultad por archivo)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Procesos para parsear/reducir/codificar en paralelo")
+    args = parser.parse_args()
+
+    procesar_cancion(args.entrada, args.carpeta_salida, args.formatos, args.practica, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Servicio HTTP local de reducción (solo librería estándar).
+
+    python servidor.py --puerto 8765 --workers 4
+
+Endpoints:
+    POST /reduce/midi   cuerpo = bytes .mid    → .mid reducido
+    POST /reduce/chart  cuerpo = texto .chart  → .chart reducido
+    GET  /stats         contadores y percentiles de latencia (JSON)
+
+Cada petición se despacha a un pool de procesos acotado. Si la cola está llena
+responde 503, si la entrada excede el tamaño máximo 413 y si el trabajo supera
+el timeout 504. Si un worker muere (OOM, segfault) el pool se recrea y la
+petición afectada recibe 503. Un trabajo que supera el timeout se mata (junto
+con el resto de trabajos en curso de ese pool, que reciben 503) para que no
+retenga workers ni cupos.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from reducer import reduce_chart_text, reduce_midi_bytes
+
+# --- CONFIGURACIÓN ---
+PUERTO_DEFECTO = 8765
+MAX_BYTES_ENTRADA = 16 * 1024 * 1024  # 16 MB
+TIMEOUT_SEGUNDOS = 30.0
+ESPERA_RECUPERACION = 5.0  # Segundos para que un pool matado marque sus trabajos como fallidos
+MUESTRAS_LATENCIA = 1000  # Ventana de latencias para los percentiles
+PERCENTILES = (50, 90, 99)
+
+
+def _reducir_midi(data):
+    return reduce_midi_bytes(data)
+
+
+def _reducir_chart(data):
+    return reduce_chart_text(data.decode('utf-8')).encode('utf-8')
+
+
+# {ruta: (función en el worker, content-type de la respuesta)}
+RUTAS_REDUCCION = {
+    '/reduce/midi': (_reducir_midi, 'audio/midi'),
+    '/reduce/chart': (_reducir_chart, 'text/plain; charset=utf-8'),
+}
+
+
+class Estadisticas:
+    """Contadores del servicio + ventana de latencias (segura entre hilos)"""
+
+    def __init__(self, muestras=MUESTRAS_LATENCIA):
+        self.lock = threading.Lock()
+        self.latencias = deque(maxlen=muestras)
+        self.contadores = {
+            'ok': 0,
+            'error': 0,
+            'rechazadas': 0,
+            'timeout': 0,
+            'demasiado_grandes': 0,
+            'pool_reiniciado': 0,
+        }
+        self.en_curso = 0
+        self.inicio = time.time()
+
+    def contar(self, clave):
+        with self.lock:
+            self.contadores[clave] += 1
+
+    def registrar_latencia(self, segundos):
+        with self.lock:
+            self.latencias.append(segundos)
+
+    def resumen(self):
+        with self.lock:
+            latencias = sorted(self.latencias)
+            datos = dict(self.contadores)
+            datos['en_curso'] = self.en_curso
+
+        datos['uptime_s'] = round(time.time() - self.inicio, 1)
+        datos['muestras_latencia'] = len(latencias)
+        for p in PERCENTILES:
+            if latencias:
+                # Percentil por rango más cercano
+                idx = max(0, -(-p * len(latencias) // 100) - 1)
+                datos[f'p{p}_ms'] = round(latencias[idx] * 1000, 2)
+            else:
+                datos[f'p{p}_ms'] = None
+        return datos
+
+
+def terminar_workers(pool):
+    """Mata los procesos de un ProcessPoolExecutor (terminate_workers() solo existe desde Python 3.14)"""
+    if hasattr(pool, 'terminate_workers'):
+        pool.terminate_workers()
+        return
+    for proceso in list((getattr(pool, '_processes', None) or {}).values()):
+        proceso.terminate()
+
+
+class ServidorReduccion(ThreadingHTTPServer):
+    """HTTP server con pool de procesos acotado y estadísticas compartidas"""
+
+    daemon_threads = True
+
+    def __init__(self, direccion, workers=None, max_pendientes=None,
+                 max_bytes=MAX_BYTES_ENTRADA, timeout=TIMEOUT_SEGUNDOS):
+        super().__init__(direccion, ManejadorReduccion)
+        workers = workers or os.cpu_count() or 1
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.lock_pool = threading.Lock()
+        # Trabajos admitidos a la vez (en ejecución + en cola del pool)
+        pendientes = max_pendientes or 2 * workers
+        self.cupos = threading.BoundedSemaphore(pendientes)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.stats = Estadisticas()
+
+    def reiniciar_pool(self, pool_roto, terminar=False):
+        """
+        Sustituye el pool si un worker murió (OOM, segfault); solo el primer hilo que lo detecta lo recrea.
+        terminar=True mata además sus workers (trabajo colgado tras un timeout): los trabajos en
+        curso en ese pool fallan con BrokenProcessPool y liberan su cupo.
+        """
+        with self.lock_pool:
+            if self.pool is pool_roto:
+                if terminar:
+                    terminar_workers(pool_roto)
+                pool_roto.shutdown(wait=False)
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                self.stats.contar('pool_reiniciado')
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+class ManejadorReduccion(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self.responder(404, b'No encontrado\n')
+            return
+        cuerpo = json.dumps(self.server.stats.resumen(), indent=2).encode('utf-8')
+        self.responder(200, cuerpo, 'application/json')
+
+    def do_POST(self):
+        ruta = RUTAS_REDUCCION.get(self.path)
+        if ruta is None:
+            self.responder(404, b'No encontrado\n')
+            return
+        funcion, content_type = ruta
+        servidor = self.server
+        stats = servidor.stats
+
+        try:
+            longitud = int(self.headers.get('Content-Length', ''))
+            if longitud < 0:
+                raise ValueError(longitud)
+        except ValueError:
+            self.responder(411, b'Falta Content-Length\n')
+            return
+        if longitud > servidor.max_bytes:
+            stats.contar('demasiado_grandes')
+            self.close_connection = True
+            self.responder(413, f'Entrada mayor que {servidor.max_bytes} bytes\n'.encode('utf-8'))
+            return
+
+        data = self.rfile.read(longitud)
+
+        if not servidor.cupos.acquire(blocking=False):
+            stats.contar('rechazadas')
+            self.responder(503, b'Servidor ocupado, reintentar\n')
+            return
+
+        inicio = time.perf_counter()
+        with stats.lock:
+            stats.en_curso += 1
+        try:
+            pool = servidor.pool
+            try:
+                futuro = pool.submit(funcion, data)
+            except BrokenProcessPool:
+                servidor.cupos.release()
+                servidor.reiniciar_pool(pool)
+                stats.contar('error')
+                self.responder(503, b'Pool de workers reiniciado, reintentar\n')
+                return
+            except Exception as e:
+                servidor.cupos.release()
+                stats.contar('error')
+                self.responder(500, f'{e}\n'.encode('utf-8'))
+                return
+            # Liberar el cupo cuando el worker termine de verdad (incluso tras un timeout)
+            futuro.add_done_callback(lambda _: servidor.cupos.release())
+            try:
+                resultado = futuro.result(timeout=servidor.timeout)
+            except FuturesTimeout:
+                # Recuperar el worker: si el trabajo aún está en cola basta con cancelarlo,
+                # si ya se ejecuta hay que matar el pool para que no retenga worker y cupo
+                if not futuro.cancel():
+                    servidor.reiniciar_pool(pool, terminar=True)
+                    # El pool marca el trabajo como fallido (y libera su cupo) de forma asíncrona
+                    wait([futuro], timeout=ESPERA_RECUPERACION)
+                stats.contar('timeout')
+                self.responder(504, b'Tiempo de reduccion agotado\n')
+                return
+            except BrokenProcessPool:
+                # Un worker murió durante este trabajo (u otro): recrear el pool
+                servidor.reiniciar_pool(pool)
+                stats.contar('error')
+                self.responder(503, b'Pool de workers reiniciado, reintentar\n')
+                return
+            except (ValueError, UnicodeDecodeError) as e:
+                stats.contar('error')
+                self.responder(400, f'{e}\n'.encode('utf-8'))
+                return
+            except Exception as e:
+                stats.contar('error')
+                self.responder(500, f'{e}\n'.encode('utf-8'))
+                return
+        finally:
+            with stats.lock:
+                stats.en_curso -= 1
+
+        stats.contar('ok')
+        stats.registrar_latencia(time.perf_counter() - inicio)
+        self.responder(200, resultado, content_type)
+
+    def responder(self, codigo, cuerpo, content_type='text/plain; charset=utf-8'):
+        self.send_response(codigo)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de GH Chart Reducer")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=PUERTO_DEFECTO)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Procesos del pool (por defecto: núcleos de CPU)")
+    parser.add_argument('--max-pendientes', type=int, default=None,
+                        help="Trabajos admitidos a la vez antes de responder 503")
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES_ENTRADA)
+    parser.add_argument('--timeout', type=float, default=TIMEOUT_SEGUNDOS)
+    args = parser.parse_args()
+
+    servidor = ServidorReduccion((args.host, args.puerto), workers=args.workers,
+                                 max_pendientes=args.max_pendientes,
+                                 max_bytes=args.max_bytes, timeout=args.timeout)
+    print(f"🎸 Servidor de reducción en http://{args.host}:{args.puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Snapshots binarios de canciones ya parseadas.
+
+Un snapshot (.ghrs) guarda lo que el reductor necesita de una canción: tipo,
+ticks per beat, offsets de header/pistas en el archivo original (pistas que se
+copian tal cual al guardar) y, por instrumento, las notas Expert y los eventos
+especiales como arrays empaquetados. Cargarlo es leer unos pocos headers con
+struct y volcar los arrays con array.frombytes, sin tokenizar el MIDI/.chart.
+
+El snapshot se invalida por hash (sha1) del archivo original: si no coincide
+se vuelve a parsear y se reescribe.
+
+    cancion = cargar_cancion("notes.mid")
+    procesados = reducir_instrumentos(cancion['instrumentos'], cancion['ticks_per_beat'])
+    salida = salida_cancion(cancion, procesados)
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from reducer import (chart_a_texto, construir_pistas_midi, detectar_instrumentos_chart,
+                     indexar_pistas_midi, leer_midi_bytes, midi_a_bytes)
+
+# --- FORMATO ---
+MAGIC = b"GHRS"
+VERSION = 2
+EXTENSION_SNAPSHOT = '.ghrs'
+TIPOS = {'midi': 0, 'chart': 1}
+
+# magic, versión, tipo, little-endian?, ticks_per_beat, sha1 del original, num_instrumentos
+CABECERA = struct.Struct("<4sHBBI20sI")
+# inicio/fin del header MIDI y número de pistas
+CABECERA_PISTAS = struct.Struct("<QQI")
+# código (16 bytes, ASCII), tiene Expert?, num notas Expert, num eventos especiales
+CABECERA_INSTRUMENTO = struct.Struct("<16sBII")
+
+# Arrays por instrumento (typecode de cada uno) en el orden en que se escriben
+ARRAYS_EXPERT = ('q', 'h', 'q')    # ticks, frets, duraciones
+ARRAYS_ESPECIALES = ('q', 'H', 'q')  # ticks, notas MIDI, duraciones
+
+
+def hash_archivo(data):
+    return hashlib.sha1(data).digest()
+
+
+def ruta_snapshot(ruta_original, directorio_cache=None):
+    """Snapshot junto al original, o en directorio_cache (nombre por hash de la ruta)"""
+    if directorio_cache is None:
+        return ruta_original + EXTENSION_SNAPSHOT
+    clave = hashlib.sha1(os.path.abspath(ruta_original).encode('utf-8')).hexdigest()[:20]
+    return os.path.join(directorio_cache, clave + EXTENSION_SNAPSHOT)
+
+
+def _alinear(salida):
+    """Rellena a múltiplo de 8 para que cada array empiece alineado"""
+    salida.extend(b"\x00" * (-len(salida) % 8))
+
+
+def _escribir_array(salida, typecode, valores):
+    salida.extend(array(typecode, valores).tobytes())
+    _alinear(salida)
+
+
+def _leer_array(buffer, pos, typecode, cantidad, invertir):
+    valores = array(typecode)
+    fin = pos + cantidad * valores.itemsize
+    if fin > len(buffer):
+        raise ValueError("Snapshot truncado")
+    valores.frombytes(buffer[pos:fin])
+    if invertir:
+        valores.byteswap()
+    return valores, fin + (-fin % 8)
+
+
+def parsear_cancion(ruta, data):
+    """Parsea el original. Retorna (tipo, ticks_per_beat, instrumentos, rango_header, rangos_pistas)"""
+    if os.path.splitext(ruta)[1].lower() == '.chart':
+        lineas = data.decode('utf-8').splitlines(keepends=True)
+        instrumentos = {
+            inst_code: {clave: diffs[clave] for clave in ('Expert', 'notas_especiales') if clave in diffs}
+            for inst_code, diffs in detectar_instrumentos_chart(lineas).items()
+            if 'Expert' in diffs
+        }
+        return 'chart', 192, instrumentos, (0, 0), []
+
+    indice = indexar_pistas_midi(data)
+    if indice is None:
+        raise ValueError("No es un archivo MIDI válido")
+    header_bytes, ticks_per_beat, rangos_pistas = indice
+    _, _, instrumentos, _ = leer_midi_bytes(data)
+    if instrumentos is None:
+        raise ValueError("No se pudo parsear el MIDI")
+    return 'midi', ticks_per_beat, instrumentos, (0, len(header_bytes)), rangos_pistas
+
+
+def escribir_snapshot(ruta_destino, hash_original, tipo, ticks_per_beat, instrumentos,
+                      rango_header, rangos_pistas):
+    salida = bytearray()
+    salida.extend(CABECERA.pack(MAGIC, VERSION, TIPOS[tipo], sys.byteorder == 'little',
+                                ticks_per_beat, hash_original, len(instrumentos)))
+    salida.extend(CABECERA_PISTAS.pack(rango_header[0], rango_header[1], len(rangos_pistas)))
+    _alinear(salida)
+    _escribir_array(salida, 'Q', [limite for rango in rangos_pistas for limite in rango])
+
+    for inst_code, data in instrumentos.items():
+        expert = data.get('Expert', [])
+        especiales = data.get('notas_especiales', [])
+        salida.extend(CABECERA_INSTRUMENTO.pack(inst_code.encode('ascii'), 'Expert' in data,
+                                                len(expert), len(especiales)))
+        _alinear(salida)
+        for typecode, columna in zip(ARRAYS_EXPERT, zip(*expert) if expert else ((), (), ())):
+            _escribir_array(salida, typecode, columna)
+        for typecode, columna in zip(ARRAYS_ESPECIALES, zip(*especiales) if especiales else ((), (), ())):
+            _escribir_array(salida, typecode, columna)
+
+    os.makedirs(os.path.dirname(ruta_destino) or '.', exist_ok=True)
+    temporal = ruta_destino + '.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(salida)
+    os.replace(temporal, ruta_destino)
+
+
+def leer_snapshot(ruta_snapshot_archivo, hash_original=None):
+    """
+    Carga un snapshot. Retorna None si no existe, es de otra versión o el hash
+    del original no coincide.
+    Retorna: (tipo, ticks_per_beat, instrumentos, rango_header, rangos_pistas)
+    """
+    try:
+        f = open(ruta_snapshot_archivo, 'rb')
+    except OSError:
+        return None
+
+    with f:
+        if os.fstat(f.fileno()).st_size < CABECERA.size:
+            return None
+        try:
+            return _leer_snapshot_mapeado(f, hash_original)
+        except (struct.error, ValueError, KeyError, UnicodeDecodeError):
+            # Snapshot truncado o corrupto: se regenera
+            return None
+
+
+def _leer_snapshot_mapeado(f, hash_original):
+    """Parsea el snapshot vía mmap: cabeceras con struct, notas con array.frombytes"""
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        magic, version, tipo_id, little, ticks_per_beat, hash_guardado, num_inst = \
+            CABECERA.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            return None
+        if hash_original is not None and hash_guardado != hash_original:
+            return None
+        invertir = bool(little) != (sys.byteorder == 'little')
+        tipo = {v: k for k, v in TIPOS.items()}[tipo_id]
+
+        pos = CABECERA.size
+        inicio_header, fin_header, num_pistas = CABECERA_PISTAS.unpack_from(buffer, pos)
+        pos += CABECERA_PISTAS.size
+        pos += -pos % 8
+        limites, pos = _leer_array(buffer, pos, 'Q', 2 * num_pistas, invertir)
+        rangos_pistas = list(zip(limites[0::2], limites[1::2]))
+
+        instrumentos = {}
+        for _ in range(num_inst):
+            codigo, tiene_expert, num_expert, num_especiales = \
+                CABECERA_INSTRUMENTO.unpack_from(buffer, pos)
+            pos += CABECERA_INSTRUMENTO.size
+            pos += -pos % 8
+
+            columnas = []
+            for typecode in ARRAYS_EXPERT:
+                columna, pos = _leer_array(buffer, pos, typecode, num_expert, invertir)
+                columnas.append(columna)
+            especiales = []
+            for typecode in ARRAYS_ESPECIALES:
+                columna, pos = _leer_array(buffer, pos, typecode, num_especiales, invertir)
+                especiales.append(columna)
+
+            data = {}
+            if tipo == 'midi' or num_especiales:
+                data['notas_especiales'] = list(zip(*especiales))
+            if tiene_expert:
+                data['Expert'] = list(zip(*columnas))
+            instrumentos[codigo.rstrip(b"\x00").decode('ascii')] = data
+
+    return tipo, ticks_per_beat, instrumentos, (inicio_header, fin_header), rangos_pistas
+
+
+def cargar_cancion(ruta, directorio_cache=None):
+    """
+    Carga una canción usando su snapshot si es válido (o lo crea si no).
+    Retorna dict con: tipo, ticks_per_beat, instrumentos y, según el tipo,
+    midi_header + midi_pistas (bytes del original) o contenido_chart (líneas).
+    """
+    with open(ruta, 'rb') as f:
+        data = f.read()
+    hash_original = hash_archivo(data)
+    destino = ruta_snapshot(ruta, directorio_cache)
+
+    snapshot = leer_snapshot(destino, hash_original)
+    if snapshot is None:
+        snapshot = parsear_cancion(ruta, data)
+        escribir_snapshot(destino, hash_original, *snapshot)
+    tipo, ticks_per_beat, instrumentos, (inicio_header, fin_header), rangos_pistas = snapshot
+
+    cancion = {'tipo': tipo, 'ticks_per_beat': ticks_per_beat, 'instrumentos': instrumentos}
+    if tipo == 'midi':
+        cancion['midi_header'] = data[inicio_header:fin_header]
+        cancion['midi_pistas'] = [data[inicio:fin] for inicio, fin in rangos_pistas]
+    else:
+        cancion['contenido_chart'] = data.decode('utf-8').splitlines(keepends=True)
+    return cancion
+
+
+def salida_cancion(cancion, instrumentos_procesados):
+    """Archivo reducido (bytes .mid o texto .chart) a partir de una canción cargada"""
+    if cancion['tipo'] == 'midi':
+        pistas = construir_pistas_midi(cancion['midi_pistas'], cancion['instrumentos'],
+                                       instrumentos_procesados, cancion['ticks_per_beat'])
+        return midi_a_bytes(cancion['midi_header'], pistas, [], len(pistas))
+    return chart_a_texto(cancion['contenido_chart'], instrumentos_procesados, cancion['instrumentos'])
@@ -0,0 +1,46 @@
+"""Canciones sintéticas (MIDI / .chart) para los tests"""
+import random
+import struct
+
+from reducer import crear_pista_midi, crear_pista_multidificultad
+
+PISTAS_INSTRUMENTO = ("PART GUITAR", "PART BASS", "PART DRUMS", "PART KEYS")
+
+
+def notas_expert(azar, num_notas, max_acorde=3):
+    """[(tick, fret, duracion), ...] con acordes, un fret por nota dentro de cada tick"""
+    notas = []
+    tick = 0
+    for _ in range(num_notas):
+        tick += azar.choice([48, 60, 120, 240])
+        duracion = azar.choice([0, 0, 120])
+        for fret in sorted(azar.sample(range(5), azar.randint(1, max_acorde))):
+            notas.append((tick, fret, duracion))
+    return notas
+
+
+def midi_de_prueba(semilla=0, num_notas=400, pistas_instrumento=("PART GUITAR", "PART BASS")):
+    """MIDI tipo 1: TEMPO, instrumentos (Expert + Star Power), PART VOCALS y EVENTS"""
+    azar = random.Random(semilla)
+    pistas = [crear_pista_midi("TEMPO", [], 0, 480)]
+    for nombre in pistas_instrumento:
+        expert = notas_expert(azar, num_notas)
+        star_power = [(tick, 116, 480) for tick, _, _ in expert[::40]]
+        pistas.append(crear_pista_multidificultad(nombre, {'Expert': expert}, star_power))
+    pistas.append(crear_pista_midi("PART VOCALS", [(i * 480, 0, 240) for i in range(num_notas)], 60, 480))
+    pistas.append(crear_pista_midi("EVENTS", [], 0, 480))
+    return b"MThd" + struct.pack(">IHHH", 6, 1, len(pistas), 480) + b"".join(pistas)
+
+
+def chart_de_prueba(semilla=0, num_notas=400):
+    azar = random.Random(semilla)
+    lineas = ['[Song]\n', '{\n', '  Resolution = 192\n', '}\n',
+              '[SyncTrack]\n', '{\n', '  0 = TS 4\n', '  0 = B 120000\n', '}\n',
+              '[ExpertSingle]\n', '{\n', '  0 = S 2 768\n']
+    tick = 0
+    for _ in range(num_notas):
+        tick += azar.choice([48, 96, 192])
+        for fret in sorted(azar.sample(range(5), azar.choice([1, 1, 2, 3]))):
+            lineas.append(f'  {tick} = N {fret} 0\n')
+    lineas.append('}\n')
+    return ''.join(lineas)
@@ -0,0 +1,146 @@
+"""Ida y vuelta de .zip y .sng: notas reemplazadas, resto de miembros intactos"""
+import os
+import struct
+import tempfile
+import unittest
+import zipfile
+
+from contenedores import escribir_contenedor, leer_bytes, listar_miembros
+
+MASCARA = bytes(range(0x30, 0x40))
+
+
+def enmascarar(data):
+    """Máscara XOR de .sng byte a byte, directamente de la especificación"""
+    return bytes(b ^ MASCARA[i % 16] ^ (i & 0xFF) for i, b in enumerate(data))
+
+
+def crear_sng(ruta, archivos, metadatos=(("name", "Tema"), ("artist", "Banda"))):
+    """.sng de referencia: cabecera, metadatos, índice de archivos y datos enmascarados"""
+    seccion_metadatos = b"".join(struct.pack("<i", len(texto)) + texto
+                                 for par in metadatos for texto in (par[0].encode(), par[1].encode()))
+    seccion_metadatos = struct.pack("<QQ", len(seccion_metadatos) + 8, len(metadatos)) + seccion_metadatos
+
+    entradas_tamano = sum(1 + len(nombre.encode()) + 16 for nombre, _ in archivos)
+    offset = 6 + 4 + 16 + len(seccion_metadatos) + 16 + entradas_tamano + 8
+    indice = struct.pack("<QQ", entradas_tamano + 8, len(archivos))
+    for nombre, data in archivos:
+        indice += struct.pack("<B", len(nombre.encode())) + nombre.encode() + struct.pack("<QQ", len(data), offset)
+        offset += len(data)
+
+    datos = b"".join(enmascarar(data) for _, data in archivos)
+    with open(ruta, 'wb') as f:
+        f.write(b"SNGPKG" + struct.pack("<I", 1) + MASCARA + seccion_metadatos + indice)
+        f.write(struct.pack("<Q", len(datos)) + datos)
+
+
+def leer_sng(ruta):
+    """Lector independiente: retorna (metadatos en bruto, {nombre: bytes sin máscara})"""
+    with open(ruta, 'rb') as f:
+        data = f.read()
+    assert data[:6] == b"SNGPKG"
+    mascara = data[10:26]
+    longitud_metadatos, = struct.unpack_from("<Q", data, 26)
+    metadatos = data[26:34 + longitud_metadatos]
+    pos = 34 + longitud_metadatos
+    _, cantidad = struct.unpack_from("<QQ", data, pos)
+    pos += 16
+    archivos = {}
+    for _ in range(cantidad):
+        longitud = data[pos]
+        nombre = data[pos + 1:pos + 1 + longitud].decode()
+        tamano, offset = struct.unpack_from("<QQ", data, pos + 1 + longitud)
+        pos += 1 + longitud + 16
+        archivos[nombre] = bytes(b ^ mascara[i % 16] ^ (i & 0xFF)
+                                 for i, b in enumerate(data[offset:offset + tamano]))
+    return metadatos, archivos
+
+
+class TestZip(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.origen = os.path.join(self.directorio.name, 'pack.zip')
+        self.audio = os.urandom(50000)
+        with zipfile.ZipFile(self.origen, 'w') as zf:
+            zf.writestr('Banda - Tema/song.ogg', self.audio, zipfile.ZIP_STORED)
+            zf.writestr('Banda - Tema/notes.mid', b'MThd original', zipfile.ZIP_DEFLATED)
+            zf.writestr('Banda - Tema/song.ini', b'[song]\nname = Tema\n' * 50, zipfile.ZIP_DEFLATED)
+            zf.writestr('Banda - Tema/album.png', b'\x89PNG' + bytes(3000), zipfile.ZIP_BZIP2)
+
+    def test_reemplaza_notas_y_copia_el_resto(self):
+        destino = os.path.join(self.directorio.name, 'REDUCED_pack.zip')
+        escribir_contenedor(destino, self.origen, b'MThd reducido', '.mid')
+
+        with zipfile.ZipFile(self.origen) as original, zipfile.ZipFile(destino) as nuevo:
+            self.assertIsNone(nuevo.testzip())
+            self.assertEqual(nuevo.namelist(), original.namelist())
+            for info in original.infolist():
+                if info.filename.endswith('notes.mid'):
+                    continue
+                copia = nuevo.getinfo(info.filename)
+                # Datos comprimidos copiados sin recomprimir
+                self.assertEqual((copia.compress_type, copia.compress_size, copia.CRC),
+                                 (info.compress_type, info.compress_size, info.CRC))
+                self.assertEqual(nuevo.read(info.filename), original.read(info.filename))
+
+        self.assertEqual(leer_bytes(destino), b'MThd reducido')
+        self.assertEqual(leer_bytes(destino + '::Banda - Tema/notes.mid'), b'MThd reducido')
+
+    def test_chart_sustituye_al_mid(self):
+        escribir_contenedor(self.origen, self.origen, b'[Song]\n', '.chart')
+        miembros = listar_miembros(self.origen)
+        self.assertIn('Banda - Tema/notes.chart', miembros)
+        self.assertNotIn('Banda - Tema/notes.mid', miembros)
+        with zipfile.ZipFile(self.origen) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('Banda - Tema/song.ogg'), self.audio)
+
+    def test_sin_origen(self):
+        with self.assertRaises(ValueError):
+            escribir_contenedor(os.path.join(self.directorio.name, 'x.zip'), None, b'', '.mid')
+
+
+class TestSng(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.origen = os.path.join(self.directorio.name, 'tema.sng')
+        self.archivos = [('song.opus', os.urandom(70000)), ('notes.mid', b'MThd original'),
+                         ('song.ini', b'[song]\n')]
+        crear_sng(self.origen, self.archivos)
+
+    def test_lectura(self):
+        self.assertEqual(listar_miembros(self.origen), [nombre for nombre, _ in self.archivos])
+        self.assertEqual(leer_bytes(self.origen), b'MThd original')
+
+    def test_ida_y_vuelta(self):
+        destino = os.path.join(self.directorio.name, 'REDUCED_tema.sng')
+        escribir_contenedor(destino, self.origen, b'MThd reducido' * 100, '.mid')
+
+        metadatos_origen, _ = leer_sng(self.origen)
+        metadatos, archivos = leer_sng(destino)
+        self.assertEqual(metadatos, metadatos_origen)
+        self.assertEqual(list(archivos), [nombre for nombre, _ in self.archivos])
+        self.assertEqual(archivos['notes.mid'], b'MThd reducido' * 100)
+        for nombre, data in self.archivos:
+            if nombre != 'notes.mid':
+                self.assertEqual(archivos[nombre], data)
+        self.assertEqual(leer_bytes(destino), b'MThd reducido' * 100)
+
+    def test_sobrescribir_el_mismo_archivo(self):
+        escribir_contenedor(self.origen, self.origen, b'[Song]\n', '.chart')
+        _, archivos = leer_sng(self.origen)
+        self.assertEqual(list(archivos), ['song.opus', 'notes.chart', 'song.ini'])
+        self.assertEqual(archivos['song.opus'], self.archivos[0][1])
+        self.assertEqual(leer_bytes(self.origen), b'[Song]\n')
+
+    def test_contenedor_de_otro_tipo(self):
+        with self.assertRaises(ValueError):
+            escribir_contenedor(os.path.join(self.directorio.name, 'x.zip'), self.origen, b'', '.mid')
+
+
+if __name__ == '__main__':
+    unittest.main()
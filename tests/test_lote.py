@@ -0,0 +1,100 @@
+"""Lotes con journal: reanudar, reintentos, salidas perdidas y workers que mueren"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import lote
+from datos_prueba import midi_de_prueba
+
+_reducir_archivo = lote.reducir_archivo
+
+
+def _reducir_o_morir(entrada, salida):
+    """Mata al worker en los archivos 'crash*' (solo la primera vez si existe LOTE_TEST_UNA_VEZ)"""
+    marca = os.environ.get('LOTE_TEST_UNA_VEZ')
+    if os.path.basename(entrada).startswith('crash') and not (marca and os.path.exists(marca)):
+        if marca:
+            open(marca, 'w').close()
+        os._exit(1)
+    return _reducir_archivo(entrada, salida)
+
+
+class TestLote(unittest.TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.raiz = directorio.name
+        self.biblioteca = os.path.join(self.raiz, 'biblioteca')
+        self.salida = os.path.join(self.raiz, 'salida')
+        self.journal = os.path.join(self.raiz, 'lote.journal')
+        for i in range(4):
+            self.escribir(f'banda/tema{i}.mid', midi_de_prueba(semilla=i, num_notas=100))
+
+    def escribir(self, relativa, data):
+        ruta = os.path.join(self.biblioteca, relativa)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as f:
+            f.write(data)
+        return ruta
+
+    def procesar(self, **kwargs):
+        return lote.procesar_biblioteca(self.biblioteca, self.salida, self.journal, log=lambda _: None, **kwargs)
+
+    def lineas_journal(self):
+        with open(self.journal, encoding='utf-8') as f:
+            return [json.loads(linea) for linea in f]
+
+    def test_reanudar_omite_completados(self):
+        self.assertEqual(self.procesar(), {'ok': 4, 'error': 0, 'omitidos': 0})
+        self.assertTrue(os.path.exists(os.path.join(self.salida, 'banda', 'REDUCED_tema0.mid')))
+
+        self.assertEqual(self.procesar(), {'ok': 0, 'error': 0, 'omitidos': 4})
+        self.assertEqual(len(self.lineas_journal()), 4)
+
+    def test_entrada_modificada_se_rehace(self):
+        self.procesar()
+        self.escribir('banda/tema1.mid', midi_de_prueba(semilla=9, num_notas=100))
+        self.assertEqual(self.procesar(), {'ok': 1, 'error': 0, 'omitidos': 3})
+
+    def test_reintentos_hasta_max_intentos(self):
+        self.escribir('roto.mid', b'esto no es un MIDI')
+        clave = os.path.abspath(os.path.join(self.biblioteca, 'roto.mid'))
+
+        self.assertEqual(self.procesar(max_intentos=2), {'ok': 4, 'error': 1, 'omitidos': 0})
+        self.assertEqual(self.procesar(max_intentos=2), {'ok': 0, 'error': 1, 'omitidos': 4})
+        self.assertEqual(lote.Journal.cargar(self.journal)[clave]['intentos'], 2)
+        # Agotados los intentos ya no se reintenta
+        self.assertEqual(self.procesar(max_intentos=2), {'ok': 0, 'error': 0, 'omitidos': 5})
+
+    def test_salida_perdida_se_rehace(self):
+        self.procesar()
+        os.remove(os.path.join(self.salida, 'banda', 'REDUCED_tema2.mid'))
+        self.assertEqual(self.procesar(), {'ok': 1, 'error': 0, 'omitidos': 3})
+        self.assertTrue(os.path.exists(os.path.join(self.salida, 'banda', 'REDUCED_tema2.mid')))
+
+    def test_pool_roto_no_cuenta_como_intento(self):
+        self.escribir('crash.mid', midi_de_prueba(semilla=5, num_notas=100))
+        marca = os.path.join(self.raiz, 'ya_murio')
+        with mock.patch.object(lote, 'reducir_archivo', _reducir_o_morir), \
+                mock.patch.dict(os.environ, {'LOTE_TEST_UNA_VEZ': marca}):
+            self.assertEqual(self.procesar(workers=3), {'ok': 5, 'error': 0, 'omitidos': 0})
+        self.assertTrue(os.path.exists(marca))
+        lineas = self.lineas_journal()
+        self.assertEqual(len(lineas), 5)
+        self.assertTrue(all(linea['estado'] == 'ok' and linea['intentos'] == 1 for linea in lineas))
+
+    def test_archivo_que_siempre_mata_al_worker(self):
+        self.escribir('crash.mid', midi_de_prueba(semilla=5, num_notas=100))
+        entorno = {k: v for k, v in os.environ.items() if k != 'LOTE_TEST_UNA_VEZ'}
+        with mock.patch.object(lote, 'reducir_archivo', _reducir_o_morir), \
+                mock.patch.dict(os.environ, entorno, clear=True):
+            self.assertEqual(self.procesar(workers=3), {'ok': 4, 'error': 1, 'omitidos': 0})
+        fallidos = [linea for linea in self.lineas_journal() if linea['estado'] == 'error']
+        self.assertEqual([os.path.basename(linea['entrada']) for linea in fallidos], ['crash.mid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
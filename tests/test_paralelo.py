@@ -0,0 +1,35 @@
+"""El camino paralelo debe dar EXACTAMENTE los mismos bytes que el camino en serie"""
+import unittest
+
+from datos_prueba import PISTAS_INSTRUMENTO, midi_de_prueba
+from reducer import generar_salidas, leer_midi_bytes, reduce_midi_bytes, reducir_instrumentos
+
+
+class TestParalelo(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.midi = midi_de_prueba(semilla=3, num_notas=1500, pistas_instrumento=PISTAS_INSTRUMENTO)
+
+    def test_reduce_midi_bytes_identico(self):
+        self.assertEqual(reduce_midi_bytes(self.midi, 4), reduce_midi_bytes(self.midi))
+
+    def test_parseo_y_reduccion_identicos(self):
+        _, _, en_serie, tpb = leer_midi_bytes(self.midi)
+        _, _, en_paralelo, _ = leer_midi_bytes(self.midi, 4)
+        self.assertEqual(en_paralelo, en_serie)
+        self.assertEqual(list(en_serie), ['Single', 'DoubleBass', 'Drums', 'Keys'])
+        self.assertEqual(reducir_instrumentos(en_paralelo, tpb, 4), reducir_instrumentos(en_serie, tpb))
+
+    def test_generar_salidas_identico(self):
+        header, pistas, instrumentos, tpb = leer_midi_bytes(self.midi)
+        cancion = {'tipo': 'midi', 'ticks_per_beat': tpb, 'instrumentos': instrumentos,
+                   'midi_header': header, 'midi_pistas': pistas}
+        procesados = reducir_instrumentos(instrumentos, tpb)
+        objetivos = [('midi', None), ('chart', None), ('midi', ['Easy']), ('chart', ['Medium'])]
+        self.assertEqual(generar_salidas(cancion, procesados, objetivos, 4),
+                         generar_salidas(cancion, procesados, objetivos))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Reducción por tablas de bitmask: equivalente a la regla original de selección de acordes"""
+import random
+import unittest
+from collections import defaultdict
+
+from reducer import (NUM_FRETS_MASCARA, aplicar_reduccion_adaptativa, parametros_reduccion,
+                     reducir_acorde)
+
+
+# --- REGLA ORIGINAL (antes de las tablas de bitmask) ---
+def reducir_acorde_original(notas, max_notas):
+    if len(notas) <= max_notas:
+        return notas
+    notas_ordenadas = sorted(notas, key=lambda x: x[0])
+    if max_notas == 1:
+        return [notas_ordenadas[0]]
+    if max_notas == 2:
+        mejor_par = notas_ordenadas[:2]
+        menor_separacion = float('inf')
+        for i in range(len(notas_ordenadas) - 1):
+            separacion = notas_ordenadas[i + 1][0] - notas_ordenadas[i][0]
+            if separacion < menor_separacion:
+                menor_separacion = separacion
+                mejor_par = notas_ordenadas[i:i + 2]
+        return mejor_par
+    return notas_ordenadas[:max_notas]
+
+
+def reduccion_original(notas_expert, dificultad, star_power_ticks=(), parametros=None):
+    spacing_mult, limite_fret, max_chord = parametros_reduccion(dificultad, parametros)
+    notas_por_tick = defaultdict(list)
+    for tick, fret, duracion in notas_expert:
+        notas_por_tick[tick].append((fret, duracion))
+    ticks_ordenados = sorted(notas_por_tick)
+
+    espaciados = sorted(b - a for a, b in zip(ticks_ordenados, ticks_ordenados[1:]) if b > a)
+    if not espaciados:
+        return notas_expert
+    min_tick_diff = int(espaciados[len(espaciados) // 2] * spacing_mult)
+
+    notas_reducidas = []
+    last_tick = -999999
+    for tick in ticks_ordenados:
+        frets_validos = [(f, d) for f, d in notas_por_tick[tick] if f <= limite_fret]
+        if not frets_validos:
+            continue
+        if tick not in star_power_ticks and tick - last_tick < min_tick_diff:
+            continue
+        if len(frets_validos) > max_chord:
+            frets_validos = reducir_acorde_original(frets_validos, max_chord)
+        notas_reducidas.extend((tick, fret, duracion) for fret, duracion in frets_validos)
+        last_tick = tick
+    return notas_reducidas
+
+
+def acorde_aleatorio(azar):
+    """Frets distintos dentro de la máscara, en orden arbitrario"""
+    frets = azar.sample(range(NUM_FRETS_MASCARA), azar.randint(1, 6))
+    return [(fret, azar.choice([0, 0, 120, 480])) for fret in frets]
+
+
+class TestReduccion(unittest.TestCase):
+
+    def test_reducir_acorde_igual_que_original(self):
+        azar = random.Random(26)
+        for _ in range(5000):
+            notas = acorde_aleatorio(azar)
+            max_notas = azar.randint(1, 4)
+            self.assertEqual(reducir_acorde(notas, max_notas), reducir_acorde_original(notas, max_notas),
+                             (notas, max_notas))
+
+    def test_reduccion_adaptativa_igual_que_original(self):
+        azar = random.Random(260)
+        for _ in range(200):
+            notas_expert = []
+            tick = 0
+            # Un acorde por tick: con frets repetidos la regla original duplicaba notas
+            for _ in range(azar.randint(1, 80)):
+                tick += azar.choice([30, 48, 60, 120, 240, 480])
+                notas_expert.extend((tick, fret, duracion) for fret, duracion in acorde_aleatorio(azar))
+            ticks = sorted({t for t, _, _ in notas_expert})
+            star_power = set(azar.sample(ticks, min(len(ticks), azar.randint(0, 3))))
+            parametros = azar.choice([None, {'max_fret': azar.randint(0, NUM_FRETS_MASCARA - 1),
+                                             'max_chord_size': azar.randint(1, 4),
+                                             'spacing_multiplier': azar.uniform(0.5, 4.0)}])
+            for dificultad in ('Hard', 'Medium', 'Easy'):
+                self.assertEqual(
+                    aplicar_reduccion_adaptativa(notas_expert, dificultad, 480, star_power, parametros),
+                    reduccion_original(notas_expert, dificultad, star_power, parametros))
+
+    def test_frets_fuera_de_mascara_se_descartan(self):
+        notas = [(-1, 0), (2, 0), (NUM_FRETS_MASCARA, 0), (3, 0), (1, 0)]
+        self.assertEqual(reducir_acorde(notas, 2), [(1, 0), (2, 0)])
+        self.assertEqual(reducir_acorde(notas, 1), [(1, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
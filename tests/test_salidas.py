@@ -0,0 +1,45 @@
+"""Salidas .chart / .mid: sin secciones duplicadas y con Star Power completo"""
+import unittest
+from collections import Counter
+
+from datos_prueba import chart_de_prueba
+from reducer import (codificar_salida, detectar_instrumentos_chart, leer_midi_bytes, reduce_chart_text,
+                     reducir_instrumentos)
+
+
+def cancion_chart(texto):
+    lineas = texto.splitlines(keepends=True)
+    return {'tipo': 'chart', 'ticks_per_beat': 192, 'instrumentos': detectar_instrumentos_chart(lineas),
+            'contenido_chart': lineas}
+
+
+class TestSalidasChart(unittest.TestCase):
+
+    def test_sin_secciones_duplicadas(self):
+        reducido = reduce_chart_text(chart_de_prueba())
+        # Un .chart que ya trae Hard/Medium/Easy: se sustituyen, no se duplican
+        otra_vez = reduce_chart_text(reducido)
+        secciones = Counter(linea for linea in otra_vez.splitlines() if linea.startswith('['))
+        self.assertEqual(max(secciones.values()), 1)
+        self.assertEqual(otra_vez, reducido)
+
+        cancion = cancion_chart(reducido)
+        procesados = reducir_instrumentos(cancion['instrumentos'], 192)
+        self.assertEqual(codificar_salida(cancion, procesados, 'chart').decode('utf-8'), reducido)
+
+    def test_star_power_en_todas_las_salidas(self):
+        cancion = cancion_chart(chart_de_prueba())
+        procesados = reducir_instrumentos(cancion['instrumentos'], 192)
+
+        practica = codificar_salida(cancion, procesados, 'chart', ['Easy']).decode('utf-8')
+        self.assertIn('  0 = S 2 768\n', practica)
+
+        completo = codificar_salida(cancion, procesados, 'chart').decode('utf-8')
+        self.assertEqual(completo.count('  0 = S 2 768\n'), 4)  # Expert + 3 regeneradas
+
+        _, _, instrumentos, _ = leer_midi_bytes(codificar_salida(cancion, procesados, 'midi'))
+        self.assertEqual(instrumentos['Single']['notas_especiales'], [(0, 116, 768)])
+
+
+if __name__ == '__main__':
+    unittest.main()
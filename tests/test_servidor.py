@@ -0,0 +1,73 @@
+"""Servicio HTTP de reducción: arranque sin Tk y recuperación de workers tras un timeout"""
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+import servidor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestSinTk(unittest.TestCase):
+
+    def test_modulos_sin_tkinter(self):
+        # sys.modules['tkinter'] = None hace fallar cualquier 'import tkinter'
+        codigo = ("import sys; sys.modules['tkinter'] = None; "
+                  "import servidor, lote, salidas, snapshot; "
+                  "from reducer import reduce_chart_text")
+        resultado = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ,
+                                   capture_output=True, text=True)
+        self.assertEqual(resultado.returncode, 0, resultado.stderr)
+
+
+
+def _colgado(data):
+    time.sleep(60)
+    return data
+
+
+def _eco(data):
+    return data
+
+
+class TestTimeout(unittest.TestCase):
+
+    def setUp(self):
+        rutas = {'/reduce/colgado': (_colgado, 'text/plain'), '/reduce/eco': (_eco, 'text/plain')}
+        parche = mock.patch.dict(servidor.RUTAS_REDUCCION, rutas)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+        # Un solo worker y un solo cupo: un trabajo colgado bloquearía todo lo demás
+        self.servidor = servidor.ServidorReduccion(('127.0.0.1', 0), workers=1, max_pendientes=1, timeout=0.5)
+        hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        hilo.start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.url = f'http://127.0.0.1:{self.servidor.server_address[1]}'
+
+    def post(self, ruta, data=b'hola'):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.url + ruta, data=data), timeout=30) as r:
+                return r.status, r.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def test_timeout_libera_worker_y_cupo(self):
+        self.assertEqual(self.post('/reduce/colgado')[0], 504)
+
+        inicio = time.monotonic()
+        estado, cuerpo = self.post('/reduce/eco')
+        self.assertEqual((estado, cuerpo), (200, b'hola'))
+        self.assertLess(time.monotonic() - inicio, 10)
+        self.assertEqual(self.servidor.stats.resumen()['timeout'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
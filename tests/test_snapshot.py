@@ -0,0 +1,67 @@
+"""Ida y vuelta de snapshots .ghrs: la salida debe ser idéntica a la del parseo directo"""
+import os
+import tempfile
+import unittest
+
+from datos_prueba import chart_de_prueba, midi_de_prueba
+from reducer import reduce_chart_text, reduce_midi_bytes, reducir_instrumentos
+from snapshot import cargar_cancion, leer_snapshot, ruta_snapshot, salida_cancion
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+
+    def escribir(self, nombre, data):
+        ruta = os.path.join(self.directorio.name, nombre)
+        with open(ruta, 'wb') as f:
+            f.write(data)
+        return ruta
+
+    def reducir(self, ruta):
+        cancion = cargar_cancion(ruta)
+        procesados = reducir_instrumentos(cancion['instrumentos'], cancion['ticks_per_beat'])
+        return salida_cancion(cancion, procesados)
+
+    def test_midi_desde_snapshot_igual_que_directo(self):
+        data = midi_de_prueba()
+        ruta = self.escribir('notes.mid', data)
+
+        primera = self.reducir(ruta)  # Parsea y crea el snapshot
+        self.assertTrue(os.path.exists(ruta_snapshot(ruta)))
+        segunda = self.reducir(ruta)  # Carga desde el snapshot
+
+        esperado = reduce_midi_bytes(data)
+        self.assertEqual(primera, esperado)
+        self.assertEqual(segunda, esperado)
+
+    def test_chart_desde_snapshot_igual_que_directo(self):
+        texto = chart_de_prueba()
+        ruta = self.escribir('notes.chart', texto.encode('utf-8'))
+
+        self.reducir(ruta)
+        self.assertEqual(self.reducir(ruta), reduce_chart_text(texto))
+
+    def test_snapshot_se_invalida_si_cambia_el_original(self):
+        ruta = self.escribir('notes.mid', midi_de_prueba(semilla=1))
+        self.reducir(ruta)
+
+        data = midi_de_prueba(semilla=2)
+        self.escribir('notes.mid', data)
+        self.assertEqual(self.reducir(ruta), reduce_midi_bytes(data))
+
+    def test_snapshot_truncado_se_ignora(self):
+        ruta = self.escribir('notes.mid', midi_de_prueba())
+        self.reducir(ruta)
+        destino = ruta_snapshot(ruta)
+        with open(destino, 'r+b') as f:
+            f.truncate(os.path.getsize(destino) // 2)
+
+        self.assertIsNone(leer_snapshot(destino))
+        self.assertEqual(self.reducir(ruta), reduce_midi_bytes(midi_de_prueba()))
+
+
+if __name__ == '__main__':
+    unittest.main()